@@ -0,0 +1,206 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from database import atualizar_tecnico_dinamico
+from query_cache import CacheConsultas
+
+# --- CONFIGURAÇÃO SEGURA DA IA DO GOOGLE ---
+# Agora ele puxa a chave do cofre do Render, protegendo contra o bloqueio do GitHub!
+GEMINI_KEY = os.environ.get("GEMINI_API_KEY")
+_genai = None
+_genai_lock = threading.Lock()
+
+def carregar_genai():
+    # O SDK do Google (e o gRPC por baixo) só é importado na primeira chamada à IA, não na subida do worker.
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                if GEMINI_KEY: genai.configure(api_key=GEMINI_KEY)
+                _genai = genai
+    return _genai
+
+# Intervalo (s) para perguntar de novo ao Google quais modelos a chave pode usar.
+IA_REVALIDAR_MODELO = float(os.getenv("IA_REVALIDAR_MODELO", "3600"))
+PREFERENCIAS = ['gemini-1.5-flash', 'gemini-1.5-flash-latest', 'gemini-flash-latest', 'gemini-1.5-pro', 'gemini-1.0-pro', 'gemini-pro']
+MARCA_COMANDO = "[UPDATE_DB|"
+# Cache das respostas do modelo para o mesmo alarme colado de novo (IA_CACHE_TTL=0 desliga).
+IA_CACHE_MAX = int(os.getenv("IA_CACHE_MAX", "500"))
+IA_CACHE_TTL = float(os.getenv("IA_CACHE_TTL", "1800"))
+
+PROMPT_SISTEMA = """Você é um Assistente Sênior de NOC (Network Operations Center) especializado em Telecom e Infraestrutura.
+        Sua missão é ajudar analistas a traduzirem logs complexos e acionarem as equipes de campo. Use formatação HTML <b> para negrito e <ul><li> para listas.
+
+        1. ANÁLISE DE ALARMES:
+        Sempre que o usuário colar um alarme (log de equipamento, energia, temperatura, LOS, BGP, etc) ou perguntar sobre um, você DEVE estruturar sua resposta EXATAMENTE assim:
+
+        <b>🔴 O que está acontecendo:</b><br>
+        (Escreva 1 ou 2 parágrafos explicando de forma simples e direta o que o alarme significa, o que falhou e qual o possível impacto na rede).<br><br>
+
+        <b>🛠️ O que falar para o técnico:</b><br>
+        (Escreva uma mensagem pronta, educada e direta para o analista copiar e enviar para o técnico. Indique o site, o equipamento e sugira o que o técnico deve testar primeiro no local - ex: medir tensão, limpar fibra, checar disjuntor).
+
+        2. ALTERAÇÃO DE ESCALA (AÇÃO NO BANCO DE DADOS):
+        Se o usuário pedir para alterar o plantão de algum técnico (ex: "Muda o João para Férias", "Coloca o Marcos na escala 8"), responda confirmando a ação, MAS a ÚLTIMA linha da sua resposta deve ser OBRIGATORIAMENTE este código:
+        [UPDATE_DB|NOME_DO_TECNICO|NOVO_STATUS]
+        Exemplo: [UPDATE_DB|Joao|Férias]
+        """
+
+class SemModeloDisponivel(Exception):
+    pass
+
+def listar_modelos_genai():
+    modelos_disponiveis = []
+    for m in carregar_genai().list_models():
+        if 'generateContent' in m.supported_generation_methods:
+            modelos_disponiveis.append(m.name.replace('models/', ''))
+    return modelos_disponiveis
+
+def criar_modelo_genai(nome):
+    return carregar_genai().GenerativeModel(nome)
+
+def escolher_modelo(modelos_disponiveis):
+    for pref in PREFERENCIAS:
+        if pref in modelos_disponiveis: return pref
+    return modelos_disponiveis[0]
+
+class ResolvedorModelo:
+    # Guarda o modelo escolhido e o cliente por processo; list_models só é chamado de novo
+    # após `revalidar` segundos ou depois de uma falha de geração (invalidar).
+    def __init__(self, listar=listar_modelos_genai, criar=criar_modelo_genai, revalidar=IA_REVALIDAR_MODELO):
+        self.listar, self.criar, self.revalidar = listar, criar, revalidar
+        self.modelos_disponiveis = []
+        self.modelo_escolhido = None
+        self._model = None
+        self._resolvido_em = 0.0
+        self._lock = threading.Lock()
+
+    def obter(self):
+        if self._model is not None and time.monotonic() - self._resolvido_em < self.revalidar: return self._model
+        with self._lock:
+            if self._model is not None and time.monotonic() - self._resolvido_em < self.revalidar: return self._model
+            try:
+                modelos_disponiveis = self.listar()
+            except Exception:
+                if self._model is None: raise
+                self._resolvido_em = time.monotonic()
+                return self._model
+            self.modelos_disponiveis = modelos_disponiveis
+            if not modelos_disponiveis:
+                self._model = None
+                raise SemModeloDisponivel()
+            escolhido = escolher_modelo(modelos_disponiveis)
+            if escolhido != self.modelo_escolhido or self._model is None:
+                self._model = self.criar(escolhido)
+                self.modelo_escolhido = escolhido
+            self._resolvido_em = time.monotonic()
+            return self._model
+
+    def invalidar(self):
+        with self._lock: self._resolvido_em = 0.0
+
+resolvedor_modelo = ResolvedorModelo()
+
+# Trechos que mudam a cada repetição do mesmo alarme: datas, horas e números de sequência do alarme.
+# Datas e horas não podem encostar em "/", ":" ou dígitos, para não comer portas (1/1/10, Gi0/0/1:10);
+# seriais de placa (SN, serial no) e IDs numéricos identificam o equipamento e ficam na chave.
+_VOLATEIS = [re.compile(p, re.IGNORECASE) for p in (
+    r'(?<![\w/:.-])\d{4}-\d{2}-\d{2}(?:[t ]\d{2}:\d{2}(?::\d{2})?(?:[.,]\d+)?)?(?:z|[+-]\d{2}:?\d{2})?(?![\w/:-])',
+    r'(?<![\w/:.-])(?:0?[1-9]|[12]\d|3[01])/(?:0?[1-9]|1[0-2])/\d{4}(?![\w/:-])',
+    r'(?<![\w/:.-])(?:[01]?\d|2[0-3]):[0-5]\d:[0-5]\d(?:[.,]\d+)?(?![\w/:-])',
+    r'\b(?:seq(?:uence)?(?:[ _-]?(?:no|nr|num(?:ber)?))?|csn|alarm[ _-]?sn)\s*[:=#]?\s*\d+\b',
+)]
+
+def normalizar_alarme(texto):
+    texto = (texto or "").casefold()
+    for padrao in _VOLATEIS: texto = padrao.sub(' ', texto)
+    return ' '.join(texto.split())
+
+def chave_cache(mensagem_usuario):
+    # Hash do texto normalizado: logs colados podem ser longos e o cache só precisa da identidade.
+    normalizado = normalizar_alarme(mensagem_usuario)
+    return hashlib.sha1(normalizado.encode('utf-8')).hexdigest() if normalizado else None
+
+def _cacheavel(texto):
+    # Respostas com [UPDATE_DB|...] alteram a escala: repetir do cache pularia (ou repetiria) a ação.
+    return bool(texto) and MARCA_COMANDO not in texto
+
+cache_ia = CacheConsultas(IA_CACHE_MAX, IA_CACHE_TTL)
+
+def montar_prompt(mensagem_usuario):
+    return PROMPT_SISTEMA + "\n\nUsuário diz: " + mensagem_usuario
+
+def executar_comando(texto_ia):
+    # Função secreta de alterar a escala: devolve (texto sem a linha do comando, html da ação)
+    if MARCA_COMANDO not in texto_ia: return texto_ia, ""
+    linhas = texto_ia.split('\n')
+    comando = [l for l in linhas if MARCA_COMANDO in l][0]
+    texto_limpo = texto_ia.replace(comando, "").strip()
+    partes = comando.replace("[", "").replace("]", "").split("|")
+    if len(partes) < 3: return texto_limpo, ""
+    resultado_db = atualizar_tecnico_dinamico(partes[1], partes[2])
+    return texto_limpo, f"<br><br><div style='background:var(--success); color:white; padding:10px; border-radius:8px;'><b>🤖 Ação da IA concluída:</b><br>{resultado_db}</div>"
+
+def html_debug(e, resolvedor=resolvedor_modelo):
+    return f"<b>Falha de conexão com a IA.</b><br>Erro técnico: {str(e)}<br><br><b>Modelos liberados na sua chave do Google:</b><br>{', '.join(resolvedor.modelos_disponiveis) if resolvedor.modelos_disponiveis else 'Nenhum modelo lido'}<br><br><i>A IA tentou usar o modelo: {resolvedor.modelo_escolhido or 'Desconhecido'}</i>"
+
+MSG_SEM_CHAVE = "A chave da API da IA não foi configurada nas variáveis de ambiente do servidor Render."
+MSG_SEM_MODELO = "Erro: A sua chave de API do Google é válida, mas não tem permissão para usar nenhum modelo de texto no momento."
+
+def responder(mensagem_usuario, resolvedor=resolvedor_modelo, cache=cache_ia, usar_cache=True):
+    chave = chave_cache(mensagem_usuario) if usar_cache else None
+    if chave:
+        cacheado, geracao = cache.obter(chave)
+        if cacheado is not None: return cacheado.replace('\n', '<br>')
+    try:
+        model = resolvedor.obter()
+        response = model.generate_content(montar_prompt(mensagem_usuario))
+        if chave and _cacheavel(response.text): cache.guardar(chave, response.text, (), geracao)
+        texto_limpo, acao = executar_comando(response.text)
+        return (texto_limpo + acao).replace('\n', '<br>')
+    except SemModeloDisponivel:
+        return MSG_SEM_MODELO
+    except Exception as e:
+        resolvedor.invalidar()
+        return html_debug(e, resolvedor)
+
+def _texto_do_pedaco(pedaco):
+    try: return pedaco.text or ""
+    except ValueError: return ""
+
+def responder_stream(mensagem_usuario, resolvedor=resolvedor_modelo, cache=cache_ia, usar_cache=True):
+    # Gera eventos {"texto": ...} conforme os tokens chegam e um {"fim": True, "acao": ...} final.
+    # A linha corrente só é liberada se não puder ser o início de um [UPDATE_DB|...].
+    chave = chave_cache(mensagem_usuario) if usar_cache else None
+    if chave:
+        cacheado, geracao = cache.obter(chave)
+        if cacheado is not None:
+            yield {"texto": cacheado.replace('\n', '<br>')}
+            yield {"fim": True, "acao": ""}
+            return
+    try:
+        model = resolvedor.obter()
+        pendente, completo = "", []
+        for pedaco in model.generate_content(montar_prompt(mensagem_usuario), stream=True):
+            texto = _texto_do_pedaco(pedaco)
+            completo.append(texto)
+            pendente += texto
+            corte = pendente.rfind('\n') + 1
+            completas, linha_atual = pendente[:corte], pendente[corte:]
+            liberar = "".join(l for l in completas.splitlines(keepends=True) if MARCA_COMANDO not in l)
+            comandos = "".join(l for l in completas.splitlines(keepends=True) if MARCA_COMANDO in l)
+            if '[' not in linha_atual: liberar, linha_atual = liberar + linha_atual, ""
+            pendente = comandos + linha_atual
+            if liberar: yield {"texto": liberar.replace('\n', '<br>')}
+        texto_limpo, acao = executar_comando(pendente)
+        if texto_limpo: yield {"texto": texto_limpo.replace('\n', '<br>')}
+        if chave and _cacheavel("".join(completo)): cache.guardar(chave, "".join(completo), (), geracao)
+        yield {"fim": True, "acao": acao}
+    except SemModeloDisponivel:
+        yield {"erro": MSG_SEM_MODELO}
+    except Exception as e:
+        resolvedor.invalidar()
+        yield {"erro": html_debug(e, resolvedor)}
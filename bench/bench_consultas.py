@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+# Roda contra um Postgres local descartável: BENCH_DATABASE_URL=postgresql://localhost/spi_bench
+# Uso: python -m bench.bench_consultas --sites 5000 --abas 30 --tecnicos 50 --dias 31 --repeticoes 200
+# ATENÇÃO: apaga e recarrega escala/sites do banco apontado por BENCH_DATABASE_URL.
+if not os.getenv("BENCH_DATABASE_URL"):
+    sys.exit("Defina BENCH_DATABASE_URL apontando para um Postgres de teste (os dados serão sobrescritos).")
+os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+# O clima roda em segundo plano; sem --clima-real aponta para uma porta fechada para não sair para a internet.
+if "--clima-real" not in sys.argv: os.environ.setdefault("OPENWEATHER_URL", "http://127.0.0.1:9/")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+import history_writer
+import query_cache
+from db_pool import conexao
+from bench.dados_sinteticos import mes_corrente, gerar_escala, gerar_sites, nome_aba, nome_tecnico, nome_base, nome_sigla, nome_cidade
+from bench.util import linha_latencias
+
+def carregar(args, tmp):
+    sites_path, escala_path = os.path.join(tmp, "sites.xlsx"), os.path.join(tmp, "escala.xlsx")
+    gerar_sites(sites_path, args.sites, args.bases)
+    mes, ano, dias_no_mes = mes_corrente()
+    celulas = gerar_escala(escala_path, args.abas, args.tecnicos, min(args.dias, dias_no_mes), mes=mes, ano=ano, bases=args.bases)
+    with conexao() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM escala")
+        cursor.execute("DELETE FROM sites")
+    print("== Ingestão ==")
+    inicio = time.perf_counter()
+    r = database.process_excel_sites(sites_path)
+    d = time.perf_counter() - inicio
+    print(f"sites:  {r['sites']} linhas em {d:.2f} s ({r['sites'] / d:,.0f} linhas/s)")
+    inicio = time.perf_counter()
+    r = database.process_excel_escala(escala_path)
+    d = time.perf_counter() - inicio
+    print(f"escala: {r['inseridos']} linhas ({celulas} células) em {d:.2f} s ({r['inseridos'] / d:,.0f} linhas/s)")
+    inicio = time.perf_counter()
+    r = database.process_excel_escala(escala_path)
+    print(f"escala (reupload sem mudanças): {time.perf_counter() - inicio:.2f} s, {r}")
+
+def termos_por_ramo(args, rnd):
+    return {
+        "aba": lambda: nome_aba(rnd.randrange(4, args.abas, 5)) if args.abas > 4 else "CAS",
+        "tecnico": lambda: nome_tecnico(rnd.randrange(args.abas), rnd.randrange(args.tecnicos)),
+        "base": lambda: nome_base(rnd.randrange(args.bases)),
+        "sigla": lambda: nome_sigla(rnd.randrange(args.sites)),
+        "cidade": lambda: nome_cidade(rnd.randrange(args.sites)).split(' - ')[0],
+        "nao_encontrado": lambda: rnd.choice(["QWZXKJ", "ZZZZZZZZ", "XPTOXPTO"]),
+    }
+
+def ramo_da_resposta(r):
+    if not r.get("encontrado"): return "nao_encontrado"
+    cab = r["cabecalho"]
+    if "Planilha(s)" in cab: return "aba"
+    if "Técnico(a)" in cab: return "tecnico"
+    if "Região / Base" in cab: return "base"
+    return "site"
+
+def medir(fn, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter(); fn(); tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência p50/p95 dos caminhos quentes de consulta e throughput de ingestão.")
+    parser.add_argument("--sites", type=int, default=5000)
+    parser.add_argument("--abas", type=int, default=30)
+    parser.add_argument("--tecnicos", type=int, default=50)
+    parser.add_argument("--dias", type=int, default=31)
+    parser.add_argument("--bases", type=int, default=9)
+    parser.add_argument("--repeticoes", type=int, default=200)
+    parser.add_argument("--sem-carga", action="store_true", help="reaproveita os dados já carregados")
+    parser.add_argument("--clima-real", action="store_true")
+    args = parser.parse_args()
+    rnd = random.Random(7)
+
+    database.init_db()
+    if not args.sem_carga:
+        with tempfile.TemporaryDirectory() as tmp: carregar(args, tmp)
+
+    # Mesmo mês/ano da escala sintética (dados_sinteticos.mes_corrente).
+    mes, ano, dias_no_mes = mes_corrente()
+    dia = f"{rnd.randint(1, min(args.dias, dias_no_mes))}/{mes}/{ano}"
+    print(f"\n== query_data ({args.repeticoes} consultas por ramo, data {dia}) ==")
+    inicio = time.perf_counter(); database.get_indice_busca()
+    print(f"construção do índice de busca: {(time.perf_counter() - inicio) * 1000:.1f} ms")
+    # Alguns ramos sorteiam entre poucos termos (9 bases, 3 inexistentes): sem limpar o cache de respostas
+    # quase tudo seria hit. "miss" limpa antes de cada chamada (custo real do ramo); "hit" repete o termo.
+    for ramo, gerar in termos_por_ramo(args, rnd).items():
+        misses, hits, ramos = [], [], {}
+        for _ in range(args.repeticoes):
+            termo = gerar()
+            query_cache.cache.limpar()
+            inicio = time.perf_counter()
+            r = database.query_data(termo, dia, "bench")
+            misses.append(time.perf_counter() - inicio)
+            inicio = time.perf_counter()
+            database.query_data(termo, dia, "bench")
+            hits.append(time.perf_counter() - inicio)
+            ramos[ramo_da_resposta(r)] = ramos.get(ramo_da_resposta(r), 0) + 1
+        print(linha_latencias(f"{ramo} (miss)", misses) + f"  ramos={ramos}")
+        print(linha_latencias(f"{ramo} (hit)", hits))
+
+    print("\n== Outros caminhos ==")
+    # Na data da escala sintética (o padrão é hoje, sem plantões) e sem o cache de listas entre as chamadas.
+    def visao_geral():
+        query_cache.listas.limpar()
+        inicio = time.perf_counter(); database.get_visao_geral(dia)
+        return time.perf_counter() - inicio
+    print(linha_latencias("get_visao_geral", [visao_geral() for _ in range(args.repeticoes)]))
+    print(linha_latencias("get_autocomplete_data", medir(database.get_autocomplete_data, args.repeticoes)))
+    indice = database.get_indice_busca()
+    print(linha_latencias("autocompletar(q)", medir(lambda: indice.autocompletar(rnd.choice(["CID", "S01", "TECNICO 0", "CM0"])), args.repeticoes)))
+    print(linha_latencias("get_historico", medir(database.get_historico, args.repeticoes)))
+    history_writer.escritor.flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from escala_loader import ler_escala
+from bench.dados_sinteticos import gerar_escala
+
+# Uso: python -m bench.bench_escala --abas 40 --tecnicos 60 --dias 31
+def main():
+    parser = argparse.ArgumentParser(description="Throughput e pico de memória da leitura da escala (sem banco).")
+    parser.add_argument("--abas", type=int, default=30)
+    parser.add_argument("--tecnicos", type=int, default=50)
+    parser.add_argument("--dias", type=int, default=31)
+    parser.add_argument("--arquivo", help="planilha existente (ignora o gerador)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.arquivo
+        if not path:
+            path = os.path.join(tmp, "escala.xlsx")
+            celulas = gerar_escala(path, args.abas, args.tecnicos, args.dias)
+            print(f"planilha sintética: {args.abas} abas x {args.tecnicos} técnicos x {args.dias} dias = {celulas} células de plantão ({os.path.getsize(path) / 1e6:.1f} MB)")
+        # Rodada de aquecimento fora da medida: a primeira chamada importa pandas/openpyxl (e o que eles
+        # carregam sob demanda), o que inflaria o tempo e o pico de memória da leitura.
+        ler_escala(path, "05-2026")
+        inicio = time.perf_counter()
+        df = ler_escala(path, "05-2026")
+        duracao = time.perf_counter() - inicio
+        # Memória numa rodada à parte: o tracemalloc deixa a leitura algumas vezes mais lenta.
+        tracemalloc.start()
+        ler_escala(path, "05-2026")
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    print(f"linhas de escala: {len(df)}")
+    print(f"tempo: {duracao:.2f} s | {len(df) / duracao:,.0f} linhas/s")
+    print(f"pico de memória (tracemalloc): {pico / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import json
+import socket
+import argparse
+import subprocess
+import urllib.request
+import urllib.error
+
+# Custo de subida de um worker: importação do main.py (em processo novo, sem cache de módulos) e
+# tempo do processo frio até a primeira resposta do /chat. Uso:
+#   python -m bench.bench_startup --repeticoes 5                  (só importação; não precisa de banco)
+#   BENCH_DATABASE_URL=postgresql://localhost/spi_bench python -m bench.bench_startup --servidor
+# --servidor sobe `gunicorn main:app` com 1 worker (o on_starting do gunicorn.conf.py roda o init_db antes)
+# e mede até o socket aceitar e até o primeiro /chat respondido.
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+from bench.util import linha_latencias
+
+# Pilha do Excel e SDK da IA são importados sob demanda; o rapidfuzz (busca fuzzy) entra na subida.
+PESADOS = ("pandas", "numpy", "openpyxl", "google.generativeai", "rapidfuzz")
+
+def medir_importacao(env):
+    # Processo novo a cada medida: o que importa é o custo de um worker recém-criado.
+    codigo = (
+        "import sys, time, json\n"
+        "inicio = time.perf_counter()\n"
+        "import main\n"
+        "duracao = time.perf_counter() - inicio\n"
+        f"print(json.dumps({{'segundos': duracao, 'pesados': [m for m in {PESADOS!r} if m in sys.modules]}}))\n"
+    )
+    saida = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, env=env, capture_output=True, text=True, check=True)
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def esperar(condicao, limite):
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        if condicao(): return True
+        time.sleep(0.01)
+    return False
+
+def aceitando(porta):
+    try:
+        with socket.create_connection(("127.0.0.1", porta), timeout=0.2): return True
+    except OSError: return False
+
+def primeira_consulta(url, termo):
+    req = urllib.request.Request(url + "/chat", data=json.dumps({"message": termo, "nome": "bench"}).encode(), headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=30) as r: return r.status == 200
+    except (urllib.error.URLError, OSError): return False
+
+def medir_servidor(env, termo, limite):
+    porta = porta_livre()
+    url = f"http://127.0.0.1:{porta}"
+    inicio = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "main:app", "-w", "1", "-b", f"127.0.0.1:{porta}"], cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not esperar(lambda: aceitando(porta), limite): raise RuntimeError("gunicorn não abriu a porta a tempo")
+        socket_ok = time.perf_counter() - inicio
+        if not esperar(lambda: primeira_consulta(url, termo), limite): raise RuntimeError("/chat não respondeu a tempo")
+        return socket_ok, time.perf_counter() - inicio
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de subida: importação do app e processo frio até a primeira resposta.")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--servidor", action="store_true", help="também sobe o gunicorn e mede até o primeiro /chat (precisa de BENCH_DATABASE_URL)")
+    parser.add_argument("--termo", default="CAMPINAS")
+    parser.add_argument("--limite", type=float, default=120, help="prazo (s) para cada etapa do --servidor")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if os.getenv("BENCH_DATABASE_URL"): env["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+    # Sem sair para a internet: o clima aponta para uma porta fechada.
+    env.setdefault("OPENWEATHER_URL", "http://127.0.0.1:9/")
+
+    print("== Importação do main.py (processo novo) ==")
+    medidas = [medir_importacao(env) for _ in range(args.repeticoes)]
+    print(linha_latencias("import main", [m["segundos"] for m in medidas]))
+    print(f"módulos pesados carregados na importação: {', '.join(medidas[-1]['pesados']) or 'nenhum'}")
+
+    if args.servidor:
+        if not os.getenv("BENCH_DATABASE_URL"): sys.exit("--servidor: defina BENCH_DATABASE_URL apontando para um Postgres de teste.")
+        print("\n== gunicorn frio (1 worker) ==")
+        socket_t, resposta_t = [], []
+        for _ in range(args.repeticoes):
+            s, r = medir_servidor(env, args.termo, args.limite)
+            socket_t.append(s); resposta_t.append(r)
+        print(linha_latencias("até aceitar conexões", socket_t))
+        print(linha_latencias("até o primeiro /chat", resposta_t))
+
+if __name__ == "__main__":
+    main()
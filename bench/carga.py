@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import json
+import random
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from collections import defaultdict
+
+# Reproduz o tráfego de um turno contra o app Flask já rodando (gunicorn ou python main.py):
+#   python -m bench.carga --url http://127.0.0.1:5000 --analistas 40 --duracao 300 --acelerar 10
+# Cada analista virtual faz /ping a cada 30 s, consulta /historico a cada 5 s (o polling do index.html)
+# e manda um /chat em intervalos exponenciais de média --intervalo-chat. --acelerar divide todos os tempos.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench.dados_sinteticos import mes_corrente, nome_aba, nome_tecnico, nome_base, nome_sigla, nome_cidade
+from bench.util import linha_latencias
+
+class Coletor:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tempos = defaultdict(list)
+        self.erros = defaultdict(int)
+
+    def registrar(self, rota, tempo, ok):
+        with self._lock:
+            self.tempos[rota].append(tempo)
+            if not ok: self.erros[rota] += 1
+
+def requisitar(base, rota, coletor, corpo=None, timeout=30):
+    dados = json.dumps(corpo).encode() if corpo is not None else None
+    req = urllib.request.Request(base + rota, data=dados, headers={"Content-Type": "application/json"} if dados else {})
+    inicio = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as r: r.read(); ok = r.status < 400
+    except urllib.error.HTTPError as e: ok = e.code == 304
+    except Exception: ok = False
+    coletor.registrar(rota.split('?')[0], time.perf_counter() - inicio, ok)
+
+def termo_aleatorio(rnd, args):
+    # Mistura aproximada do que os analistas digitam: maioria sigla/cidade, alguns técnicos, bases e abas.
+    sorteio = rnd.random()
+    if sorteio < 0.45: return nome_sigla(rnd.randrange(args.sites))
+    if sorteio < 0.65: return nome_cidade(rnd.randrange(args.sites)).split(' - ')[0]
+    if sorteio < 0.80: return nome_tecnico(rnd.randrange(args.abas), rnd.randrange(args.tecnicos))
+    if sorteio < 0.90: return nome_base(rnd.randrange(args.bases))
+    if sorteio < 0.95: return nome_aba(rnd.randrange(4, max(args.abas, 5), 5))
+    return rnd.choice(["QWZXKJ", "XPTOXPTO"])
+
+def analista(i, args, coletor, fim):
+    rnd = random.Random(1000 + i)
+    usuario = f"ANALISTA {i:03d}"
+    a = args.acelerar
+    mes, _, dias_no_mes = mes_corrente()
+    proximo = {"ping": time.monotonic(), "historico": time.monotonic() + rnd.uniform(0, 5 / a), "chat": time.monotonic() + rnd.expovariate(a / args.intervalo_chat)}
+    while True:
+        rota, quando = min(proximo.items(), key=lambda x: x[1])
+        if quando >= fim: return
+        time.sleep(max(0, quando - time.monotonic()))
+        if rota == "ping":
+            requisitar(args.url, "/ping", coletor, {"nome": usuario})
+            proximo["ping"] += 30 / a
+        elif rota == "historico":
+            requisitar(args.url, "/historico", coletor)
+            proximo["historico"] += 5 / a
+        else:
+            requisitar(args.url, "/chat", coletor, {"message": termo_aleatorio(rnd, args), "data": f"{rnd.randint(1, min(args.dias, dias_no_mes))}/{mes}", "nome": usuario})
+            proximo["chat"] = time.monotonic() + rnd.expovariate(a / args.intervalo_chat)
+
+def main():
+    parser = argparse.ArgumentParser(description="Driver de carga: mistura de /chat, /ping e /historico de um turno.")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--analistas", type=int, default=40)
+    parser.add_argument("--duracao", type=float, default=300, help="segundos de relógio")
+    parser.add_argument("--acelerar", type=float, default=1, help="fator de compressão do tempo do turno")
+    parser.add_argument("--intervalo-chat", type=float, default=20, help="média (s) entre consultas de um analista")
+    # Devem bater com os parâmetros usados para carregar os dados (bench.bench_consultas).
+    parser.add_argument("--sites", type=int, default=5000)
+    parser.add_argument("--abas", type=int, default=30)
+    parser.add_argument("--tecnicos", type=int, default=50)
+    parser.add_argument("--bases", type=int, default=9)
+    parser.add_argument("--dias", type=int, default=31)
+    args = parser.parse_args()
+    args.url = args.url.rstrip('/')
+
+    coletor = Coletor()
+    fim = time.monotonic() + args.duracao
+    threads = [threading.Thread(target=analista, args=(i, args, coletor, fim), daemon=True) for i in range(args.analistas)]
+    inicio = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    decorrido = time.perf_counter() - inicio
+
+    total = sum(len(v) for v in coletor.tempos.values())
+    print(f"{args.analistas} analistas, {decorrido:.1f} s, {total} requisições ({total / decorrido:.1f} req/s)")
+    for rota in sorted(coletor.tempos):
+        print(linha_latencias(rota, coletor.tempos[rota], largura=12) + f"  erros={coletor.erros[rota]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import random
+import calendar
+from datetime import date, datetime
+from openpyxl import Workbook
+
+HORARIOS = ['1', '2', '3', '5', '7', '8', '14', 'A', 'D', 'G', 'K', 'S', 'W']
+FOLGAS = ['F', 'FE', 'FF', 'C', 'L', '']
+
+def mes_corrente():
+    # (mês, ano, dias no mês) de hoje. A escala sintética vai para o mês corrente: o índice de busca
+    # só enxerga do mês corrente em diante e a retenção (ESCALA_MESES_RETIDOS) apaga meses antigos.
+    hoje = date.today()
+    return hoje.month, hoje.year, calendar.monthrange(hoje.year, hoje.month)[1]
+
+def nome_aba(a):
+    # Uma em cada cinco abas é de CAS, para exercitar o ramo de busca por planilha do query_data.
+    return f"DDD {11 + a} CAS" if a % 5 == 4 else f"DDD {11 + a}"
+
+def nome_tecnico(a, t):
+    return f"TECNICO {a:03d}-{t:04d}"
+
+def nome_base(b):
+    return f"CM{b:02d}"
+
+def gerar_escala(path, abas=20, tecnicos_por_aba=40, dias=31, mes=5, ano=2026, bases=9, seed=42):
+    # Planilha no formato das escalas reais: título, linha de cabeçalho com 'FUNCIONÁRIOS' e um dia por coluna.
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+    for a in range(abas):
+        ws = wb.create_sheet(nome_aba(a))
+        ws.append([f"ESCALA DE SOBREAVISO - DDD {11 + a}"])
+        ws.append(['FUNCIONÁRIOS', 'CONTATO CORP', 'SUPERVISOR', 'CM', 'SEGMENTO'] + [datetime(ano, mes, d) for d in range(1, dias + 1)])
+        for t in range(tecnicos_por_aba):
+            plantoes = [rnd.choice(HORARIOS) if rnd.random() < 0.4 else rnd.choice(FOLGAS) for _ in range(dias)]
+            ws.append([nome_tecnico(a, t), 11900000000 + a * 10000 + t, f"SUPERVISOR {a % 7}", nome_base((a + t) % bases), rnd.choice(['INFRA', 'TX', 'INFRA/TX'])] + plantoes)
+    ws = wb.create_sheet("LEGENDA")
+    ws.append(['CODIGO', 'HORARIO'])
+    wb.save(path)
+    return abas * tecnicos_por_aba * dias
+
+def nome_sigla(i):
+    return f"S{i:05d}"
+
+def nome_cidade(i):
+    return f"CIDADE {i % 900:03d} - SP"
+
+def gerar_sites(path, sites=5000, bases=9, seed=42):
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("SITES")
+    ws.append(['SIGLA', 'NOME DA LOCALIDADE', 'DDD', 'CM'])
+    for i in range(sites):
+        ws.append([nome_sigla(i), nome_cidade(i), str(11 + i % 9), nome_base(rnd.randrange(bases))])
+    wb.save(path)
+    return sites
@@ -0,0 +1,13 @@
+import math
+
+def percentil(valores, p):
+    if not valores: return float('nan')
+    ordenados = sorted(valores)
+    k = max(0, min(len(ordenados) - 1, math.ceil(p / 100 * len(ordenados)) - 1))
+    return ordenados[k]
+
+def linha_latencias(nome, tempos, largura=28):
+    # tempos em segundos; impresso em ms
+    if not tempos: return f"{nome:<{largura}} sem amostras"
+    ms = [t * 1000 for t in tempos]
+    return f"{nome:<{largura}} n={len(ms):<6} p50={percentil(ms, 50):8.2f} ms  p95={percentil(ms, 95):8.2f} ms  p99={percentil(ms, 99):8.2f} ms  max={max(ms):8.2f} ms"
@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import select
+import logging
+import threading
+import psycopg2
+import psycopg2.extensions
+from db_pool import DB_URL, apos_commit
+
+# Versão por domínio de dados (tabela versoes_dados) + NOTIFY no canal spi_dados na mesma transação
+# de quem escreve. Cada worker escuta o canal numa conexão dedicada e roda os handlers do domínio,
+# então os caches em memória (índice de busca, query_cache, listas, aviso) dos outros workers caem
+# em milissegundos. O worker que escreveu já invalida na hora (apos_commit) e ignora o próprio aviso.
+# A cada DADOS_VERIFICAR s (e ao reconectar) a tabela é relida: versão que andou sem aviso -> invalida tudo do domínio.
+CANAL = "spi_dados"
+DADOS_LISTEN = os.getenv("DADOS_LISTEN", "1") == "1"
+DADOS_VERIFICAR = float(os.getenv("DADOS_VERIFICAR", "30"))
+# O payload do NOTIFY tem limite de 8000 bytes; detalhe maior vira "invalida tudo do domínio".
+PAYLOAD_MAX = 7000
+
+log = logging.getLogger("spi.versoes")
+
+_handlers = {}
+_conhecidas = {}
+_conhecidas_lock = threading.Lock()
+stats = {"avisos": 0, "proprios": 0, "resincronizados": 0, "reconexoes": 0}
+
+def ao_mudar(dominio, fn):
+    # fn(detalhe): detalhe é o dict passado ao incrementar, ou None quando só se sabe que o domínio mudou.
+    _handlers.setdefault(dominio, []).append(fn)
+
+def _registrar(dominio, versao):
+    # True se a versão é nova para este worker.
+    with _conhecidas_lock:
+        if versao <= _conhecidas.get(dominio, -1): return False
+        _conhecidas[dominio] = versao
+        return True
+
+def incrementar(cursor, dominio, **detalhe):
+    # Chamado dentro da transação de escrita: versão e NOTIFY só valem (e só são entregues) no commit.
+    cursor.execute("""INSERT INTO versoes_dados (dominio, versao, atualizado_em) VALUES (%s, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT (dominio) DO UPDATE SET versao = versoes_dados.versao + 1, atualizado_em = CURRENT_TIMESTAMP RETURNING versao""", (dominio,))
+    versao = cursor.fetchone()[0]
+    payload = json.dumps({"dominio": dominio, "versao": versao, "pid": os.getpid(), "detalhe": detalhe}, ensure_ascii=False, default=str)
+    if len(payload.encode()) > PAYLOAD_MAX: payload = json.dumps({"dominio": dominio, "versao": versao, "pid": os.getpid(), "detalhe": None})
+    cursor.execute("SELECT pg_notify(%s, %s)", (CANAL, payload))
+    apos_commit(lambda: _registrar(dominio, versao))
+    return versao
+
+def _disparar(dominio, detalhe):
+    for fn in _handlers.get(dominio, []):
+        try: fn(detalhe)
+        except Exception: log.exception("falha no handler de %s", dominio)
+
+def _tratar_aviso(payload):
+    try: msg = json.loads(payload)
+    except ValueError: return
+    if not _registrar(msg["dominio"], msg["versao"]): return
+    if msg.get("pid") == os.getpid():
+        stats["proprios"] += 1
+        return
+    stats["avisos"] += 1
+    _disparar(msg["dominio"], msg.get("detalhe"))
+
+def _resincronizar(cursor, primeira=False):
+    cursor.execute("SELECT dominio, versao FROM versoes_dados")
+    for dominio, versao in cursor.fetchall():
+        with _conhecidas_lock: conhecida = _conhecidas.get(dominio)
+        if _registrar(dominio, versao) and conhecida is not None and not primeira:
+            stats["resincronizados"] += 1
+            _disparar(dominio, None)
+
+def _escutar():
+    primeira = True
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(DB_URL)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            cursor = conn.cursor()
+            cursor.execute(f"LISTEN {CANAL}")
+            # Depois do LISTEN: o que mudou enquanto não escutávamos aparece na releitura.
+            _resincronizar(cursor, primeira)
+            primeira = False
+            ultima_verificacao = time.monotonic()
+            while True:
+                if select.select([conn], [], [], DADOS_VERIFICAR) != ([], [], []):
+                    conn.poll()
+                    while conn.notifies: _tratar_aviso(conn.notifies.pop(0).payload)
+                if time.monotonic() - ultima_verificacao >= DADOS_VERIFICAR:
+                    _resincronizar(cursor)
+                    ultima_verificacao = time.monotonic()
+        except Exception:
+            stats["reconexoes"] += 1
+            log.warning("listener de %s caiu; reconectando", CANAL, exc_info=True)
+            time.sleep(5)
+        finally:
+            if conn is not None and not conn.closed: conn.close()
+
+_thread = None
+_pid = None
+_lock = threading.Lock()
+
+def iniciar():
+    global _thread, _pid
+    if not DADOS_LISTEN or not DB_URL or (_thread is not None and _pid == os.getpid()): return
+    with _lock:
+        if _thread is not None and _pid == os.getpid(): return
+        # Após o fork, as versões herdadas do master não valem para este processo.
+        with _conhecidas_lock: _conhecidas.clear()
+        _pid = os.getpid()
+        _thread = threading.Thread(target=_escutar, name="versoes-dados", daemon=True)
+        _thread.start()
+
+def status():
+    with _conhecidas_lock: versoes = dict(_conhecidas)
+    return dict(stats, versoes=versoes, escutando=bool(_thread and _thread.is_alive() and _pid == os.getpid()))
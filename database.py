@@ -1,14 +1,19 @@
 import os
-import psycopg2
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from psycopg2.extras import RealDictCursor, execute_values
-import pandas as pd
-from datetime import datetime, timedelta
-from thefuzz import process
-import urllib.request
-import urllib.parse
-import json
-
-DB_URL = os.getenv("DATABASE_URL")
+from datetime import date, datetime, timedelta
+import search_index
+import weather
+import events
+import presence
+import history_writer
+import escala_loader
+import migrations
+import query_cache
+import metrics
+import data_versions
+from db_pool import conexao, apos_commit
 
 LEGENDA_HORARIOS = {
     '1': '07:00 as 16:00', '2': '07:30 as 16:30', '3': '08:00 as 17:00',
@@ -28,143 +33,134 @@ LEGENDA_HORARIOS = {
     'AB': '08:01 as 08:00', 'AC': '12:01 ás 07:00', 'AD': '22:00 as 03:00'
 }
 
-def get_connection():
-    return psycopg2.connect(DB_URL)
+# Meses da escala guardados antes do mês corrente; cada upload apaga os mais antigos (0 = só do mês corrente em diante).
+ESCALA_MESES_RETIDOS = int(os.getenv("ESCALA_MESES_RETIDOS", "3"))
+
+def _inicio_do_mes(meses_antes=0):
+    # 1º dia do mês corrente (horário de Brasília), recuado meses_antes meses.
+    hoje = (datetime.now() - timedelta(hours=3)).date()
+    total = hoje.year * 12 + hoje.month - 1 - meses_antes
+    return date(total // 12, total % 12 + 1, 1)
 
 def init_db():
-    conn = get_connection()
-    conn.autocommit = True
-    cursor = conn.cursor()
-    cursor.execute('''CREATE TABLE IF NOT EXISTS sites (sigla TEXT PRIMARY KEY, nome_da_localidade TEXT, ddd TEXT, cm_responsavel TEXT)''')
-    cursor.execute('''CREATE TABLE IF NOT EXISTS escala (id SERIAL PRIMARY KEY, ddd_aba TEXT, tecnico TEXT, contato_corp TEXT, supervisor TEXT, cm TEXT, segmento TEXT, dia_mes TEXT, mes_ano TEXT, horario TEXT)''')
-    cursor.execute('''CREATE TABLE IF NOT EXISTS sugestoes (id SERIAL PRIMARY KEY, usuario TEXT, texto TEXT, data TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    cursor.execute('''CREATE TABLE IF NOT EXISTS historico (id SERIAL PRIMARY KEY, usuario TEXT, sigla TEXT, status TEXT, data TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    cursor.execute('''CREATE TABLE IF NOT EXISTS usuarios_online (nome TEXT PRIMARY KEY, ultima_atividade TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    cursor.execute('''CREATE TABLE IF NOT EXISTS avisos (id SERIAL PRIMARY KEY, texto TEXT, ativo BOOLEAN DEFAULT TRUE, data TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    try: cursor.execute("ALTER TABLE historico ADD COLUMN IF NOT EXISTS usuario TEXT DEFAULT 'Anônimo'")
-    except: pass
-    conn.close()
+    with conexao() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''CREATE TABLE IF NOT EXISTS sites (sigla TEXT PRIMARY KEY, nome_da_localidade TEXT, ddd TEXT, cm_responsavel TEXT)''')
+        cursor.execute('''CREATE TABLE IF NOT EXISTS escala (id SERIAL PRIMARY KEY, ddd_aba TEXT, tecnico TEXT, contato_corp TEXT, supervisor TEXT, cm TEXT, segmento TEXT, dia_mes TEXT, mes_ano TEXT, horario TEXT)''')
+        cursor.execute('''CREATE TABLE IF NOT EXISTS sugestoes (id SERIAL PRIMARY KEY, usuario TEXT, texto TEXT, data TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        cursor.execute('''CREATE TABLE IF NOT EXISTS historico (id SERIAL PRIMARY KEY, usuario TEXT, sigla TEXT, status TEXT, data TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        cursor.execute('''CREATE TABLE IF NOT EXISTS usuarios_online (nome TEXT PRIMARY KEY, ultima_atividade TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        cursor.execute('''CREATE TABLE IF NOT EXISTS avisos (id SERIAL PRIMARY KEY, texto TEXT, ativo BOOLEAN DEFAULT TRUE, data TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        cursor.execute("ALTER TABLE historico ADD COLUMN IF NOT EXISTS usuario TEXT DEFAULT 'Anônimo'")
+        cursor.execute('''CREATE TABLE IF NOT EXISTS upload_jobs (id TEXT PRIMARY KEY, tipo TEXT, arquivo TEXT, status TEXT, progresso TEXT DEFAULT '[]', linhas INTEGER DEFAULT 0, resultado TEXT, erro TEXT, criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP, inicio TIMESTAMP, fim TIMESTAMP)''')
+        migrations.migrar(cursor)
+
+def _carregar_indice():
+    with conexao() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("SELECT sigla, nome_da_localidade, ddd, cm_responsavel FROM sites")
+        sites = cursor.fetchall()
+        # Só do mês corrente em diante: quem saiu da escala deixa de casar na busca e no autocomplete.
+        inicio = _inicio_do_mes()
+        cursor.execute("SELECT DISTINCT tecnico FROM escala WHERE data_plantao >= %s AND tecnico != ''", (inicio,))
+        tecnicos = [r['tecnico'] for r in cursor.fetchall()]
+        cursor.execute("SELECT DISTINCT cm FROM escala WHERE data_plantao >= %s AND cm != ''", (inicio,))
+        bases = [r['cm'] for r in cursor.fetchall()]
+        cursor.execute("SELECT DISTINCT ddd_aba FROM escala WHERE data_plantao >= %s", (inicio,))
+        abas = [r['ddd_aba'] for r in cursor.fetchall()]
+    return {"sites": sites, "tecnicos": tecnicos, "bases": bases, "abas": abas}
+
+@metrics.medido("indice")
+def get_indice_busca():
+    return search_index.obter(_carregar_indice)
 
 def atualizar_tecnico_dinamico(nome_incompleto, novo_status):
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("SELECT DISTINCT tecnico FROM escala WHERE tecnico != ''")
-    tecnicos_db = [r['tecnico'] for r in cursor.fetchall()]
-    match_tec = process.extractOne(nome_incompleto, tecnicos_db)
-    if match_tec and match_tec[1] >= 75:
+    match_tec = get_indice_busca().tecnicos.melhor(nome_incompleto, 75)
+    if match_tec:
         nome_oficial = match_tec[0]
         hoje = datetime.now() - timedelta(hours=3)
-        dia_alvo = str(hoje.day)
-        cursor.execute("UPDATE escala SET horario = %s WHERE tecnico = %s AND dia_mes = %s", (novo_status.upper(), nome_oficial, dia_alvo))
-        conn.commit()
-        conn.close()
+        data_alvo = hoje.date()
+        with conexao() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE escala SET horario = %s WHERE tecnico = %s AND data_plantao = %s", (novo_status.upper(), nome_oficial, data_alvo))
+            data_versions.incrementar(cursor, "escala", tecnico=nome_oficial, data=data_alvo.isoformat())
+            apos_commit(lambda: query_cache.invalidar(("tecnico", data_alvo, nome_oficial)))
         return f"Escala de **{nome_oficial}** alterada para **{novo_status.upper()}** com sucesso para o dia de hoje!"
-    conn.close()
     return f"Não encontrei nenhum técnico parecido com '{nome_incompleto}' na base de dados para alterar."
 
 def set_aviso(texto):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE avisos SET ativo = FALSE")
-    if texto.strip(): cursor.execute("INSERT INTO avisos (texto, ativo) VALUES (%s, TRUE)", (texto,))
-    conn.commit()
-    conn.close()
+    with conexao() as conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE avisos SET ativo = FALSE")
+        if texto.strip(): cursor.execute("INSERT INTO avisos (texto, ativo) VALUES (%s, TRUE)", (texto,))
+        data_versions.incrementar(cursor, "aviso")
+        apos_commit(lambda: events.publicar("aviso"))
 
 def get_aviso():
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("SELECT texto FROM avisos WHERE ativo = TRUE ORDER BY data DESC LIMIT 1")
-    row = cursor.fetchone()
-    conn.close()
+    with conexao() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("SELECT texto FROM avisos WHERE ativo = TRUE ORDER BY data DESC LIMIT 1")
+        row = cursor.fetchone()
     return row['texto'] if row else ""
 
-def get_visao_geral():
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    hoje = datetime.now() - timedelta(hours=3)
-    dia_alvo = str(hoje.day)
-    cursor.execute("SELECT * FROM escala WHERE dia_mes = %s AND tecnico != '' ORDER BY cm ASC, tecnico ASC", (dia_alvo,))
-    plantoes = cursor.fetchall()
-    conn.close()
+def get_visao_geral(data_consulta=None):
+    # Em cache por data (query_cache.listas); uploads e edições da escala invalidam por tag em todos os workers.
+    data_alvo = _data_alvo(data_consulta)
+    resultado, geracao = query_cache.listas.obter(("visao_geral", data_alvo))
+    if resultado is not None: return resultado
+    with conexao() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("SELECT * FROM escala WHERE data_plantao = %s AND tecnico != '' ORDER BY cm ASC, tecnico ASC", (data_alvo,))
+        plantoes = cursor.fetchall()
     resultado = {}
     for p in plantoes:
         base = p['cm'] if p['cm'] else 'SEM BASE/OUTROS'
         if base not in resultado: resultado[base] = []
         h_fmt = LEGENDA_HORARIOS.get(p['horario'], f"Escala {p['horario']}")
         resultado[base].append({"tecnico": p['tecnico'], "contato": p['contato_corp'], "horario": h_fmt, "segmento": p['segmento']})
+    tags = {("data", data_alvo)} | {("tecnico", data_alvo, p['tecnico']) for p in plantoes}
+    query_cache.listas.guardar(("visao_geral", data_alvo), resultado, tags, geracao)
     return resultado
 
+@metrics.medido("clima")
 def get_clima(cidade):
-    if not cidade: return ""
-    try:
-        cidade_limpa = cidade.split('-')[0].split('/')[0].strip()
-        cidade_encoded = urllib.parse.quote(f"{cidade_limpa},BR")
-        api_key = "6abae122cfa3da2782b88a9b7b17ced7"
-        url = f"https://api.openweathermap.org/data/2.5/weather?q={cidade_encoded}&appid={api_key}&units=metric&lang=pt_br"
-        req = urllib.request.Request(url)
-        with urllib.request.urlopen(req, timeout=2) as response:
-            dados = json.loads(response.read().decode())
-            temp = round(dados['main']['temp'])
-            desc = dados['weather'][0]['description'].capitalize()
-            return f"<br>☁️ <b>Clima Agora:</b> {temp}°C - {desc}"
-    except Exception: return ""
+    # Leitura do cache (weather.py); o HTTP ao OpenWeatherMap roda fora do caminho da consulta.
+    # Devolve (texto, pendente): pendente é o primeiro fetch da cidade ainda em voo.
+    return weather.cache_clima.obter_estado(cidade)
 
 def get_autocomplete_data():
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("SELECT sigla, nome_da_localidade FROM sites")
-    sites = cursor.fetchall()
-    cursor.execute("SELECT DISTINCT cm FROM escala WHERE cm != ''")
-    bases = cursor.fetchall()
-    cursor.execute("SELECT DISTINCT tecnico FROM escala WHERE tecnico != ''")
-    tecnicos = cursor.fetchall()
-    conn.close()
-    resultado = []
-    for s in sites:
-        resultado.append({"termo": s['sigla'], "detalhe": s['nome_da_localidade'], "tipo": "📍 Site"})
-        if s['nome_da_localidade']: resultado.append({"termo": s['nome_da_localidade'], "detalhe": s['sigla'], "tipo": "🏙️ Cidade"})
-    for b in bases:
-        if b['cm']: resultado.append({"termo": b['cm'], "detalhe": "Região Inteira", "tipo": "🗺️ Base"})
-    for t in tecnicos:
-        if t['tecnico']: resultado.append({"termo": t['tecnico'], "detalhe": "Plantonista", "tipo": "👨‍🔧 Técnico"})
-    return resultado
+    # Lista completa, montada junto com o índice de busca (só muda após upload de sites/escala).
+    return get_indice_busca().sugestoes
 
 def get_all_tecnicos():
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("SELECT DISTINCT tecnico, contato_corp FROM escala WHERE tecnico != '' ORDER BY tecnico ASC")
-    rows = cursor.fetchall()
-    conn.close()
-    return [{"nome": r['tecnico'], "contato": r['contato_corp']} for r in rows]
+    tecnicos, geracao = query_cache.listas.obter(("tecnicos",))
+    if tecnicos is not None: return tecnicos
+    with conexao() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("SELECT DISTINCT tecnico, contato_corp FROM escala WHERE data_plantao >= %s AND tecnico != '' ORDER BY tecnico ASC", (_inicio_do_mes(),))
+        rows = cursor.fetchall()
+    tecnicos = [{"nome": r['tecnico'], "contato": r['contato_corp']} for r in rows]
+    query_cache.listas.guardar(("tecnicos",), tecnicos, {("escala",)}, geracao)
+    return tecnicos
 
 def ping_user(nome):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO usuarios_online (nome, ultima_atividade) VALUES (%s, CURRENT_TIMESTAMP) ON CONFLICT (nome) DO UPDATE SET ultima_atividade = CURRENT_TIMESTAMP", (nome,))
-    conn.commit()
-    conn.close()
+    # Só memória; o upsert em lote roda em segundo plano (presence.py).
+    presence.rastreador.ping(nome)
 
 def get_online_users():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT nome FROM usuarios_online WHERE ultima_atividade >= NOW() - INTERVAL '2 minutes'")
-    rows = cursor.fetchall()
-    conn.close()
-    return [r[0] for r in rows]
-
-def save_historico(usuario, sigla, status):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO historico (usuario, sigla, status) VALUES (%s, %s, %s)", (usuario, sigla, status))
-    conn.commit()
-    conn.close()
+    return presence.rastreador.online()
+
+@metrics.medido("historico")
+def save_historico(usuario, sigla, status, base=None):
+    # Enfileira para gravação em lote (history_writer.py); a consulta não espera pelo commit.
+    # base: CM usada na resposta, para as estatísticas por base (history_rollup.py).
+    history_writer.escritor.enviar(usuario, sigla, status, base)
 
 def get_historico():
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("SELECT usuario, sigla, status, data FROM historico ORDER BY data DESC LIMIT 15")
-    rows = cursor.fetchall()
-    conn.close()
+    with conexao() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("SELECT usuario, sigla, status, data FROM historico ORDER BY data DESC LIMIT 15")
+        rows = cursor.fetchall()
     resultados = []
     for r in rows:
         hora_br = r['data'] - timedelta(hours=3)
@@ -172,30 +168,30 @@ def get_historico():
     return resultados
 
 def save_suggestion(usuario, texto):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO sugestoes (usuario, texto) VALUES (%s, %s)", (usuario, texto))
-    conn.commit()
-    conn.close()
+    with conexao() as conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO sugestoes (usuario, texto) VALUES (%s, %s)", (usuario, texto))
 
 def get_suggestions():
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("SELECT usuario, texto, data FROM sugestoes ORDER BY data DESC")
-    rows = cursor.fetchall()
-    conn.close()
+    with conexao() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("SELECT usuario, texto, data FROM sugestoes ORDER BY data DESC")
+        rows = cursor.fetchall()
     resultados = []
     for r in rows:
         hora_br = r['data'] - timedelta(hours=3)
         resultados.append({"usuario": r['usuario'], "texto": r['texto'], "data": hora_br.strftime('%d/%m/%Y %H:%M')})
     return resultados
 
-def process_excel_sites(file_path):
+# progresso(aba, linhas) é chamado após cada aba lida e progresso(None, total) dentro da
+# transação, logo antes de gravar (usado pelo jobs.py para cancelar/serializar uploads).
+def process_excel_sites(file_path, progresso=None):
+    # pandas só é carregado no primeiro upload, não na subida do worker.
+    import pandas as pd
     xl = pd.ExcelFile(file_path)
-    conn = get_connection()
-    cursor = conn.cursor()
     dados_dict = {}
     for sheet in xl.sheet_names:
+        antes = len(dados_dict)
         df = xl.parse(sheet, dtype=str).fillna('')
         header_idx = -1
         for i, row in df.iterrows():
@@ -222,80 +218,55 @@ def process_excel_sites(file_path):
                 ddd = str(row.get(col_ddd, '')).replace('.0', '').replace('nan', '').strip() if col_ddd else ''
                 cm = str(row.get(col_cm, '')).replace('nan', '').strip().upper() if col_cm else ''
                 if len(sigla) <= 10: dados_dict[sigla] = (sigla, nome, ddd, cm)
+        if progresso: progresso(sheet, len(dados_dict) - antes)
 
     dados_insercao = list(dados_dict.values())
     if dados_insercao:
-        execute_values(cursor, "INSERT INTO sites (sigla, nome_da_localidade, ddd, cm_responsavel) VALUES %s ON CONFLICT (sigla) DO UPDATE SET nome_da_localidade=EXCLUDED.nome_da_localidade, ddd=EXCLUDED.ddd, cm_responsavel=EXCLUDED.cm_responsavel", dados_insercao)
-    conn.commit()
-    conn.close()
-
-def process_excel_escala(file_path):
-    xl = pd.ExcelFile(file_path, engine='openpyxl')
-    hoje_br = datetime.now() - timedelta(hours=3)
-    mes_ano = hoje_br.strftime('%m-%Y')
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM escala")
-    abas_alvo = xl.sheet_names
-    chaves_vistas = set()
-    all_rows = []
-
-    for aba in abas_alvo:
-        if aba.strip().upper() in ['LEGENDA', 'INSTRUÇÕES', 'RESUMO', 'MENU']: continue
-        df = xl.parse(aba, dtype=str).fillna('')
-        header_row = []
-        df_dados = df
-        if any('FUNCION' in str(c).strip().upper() for c in df.columns): header_row = df.columns
-        else:
-            for i, row in df.iterrows():
-                if any('FUNCION' in str(v).strip().upper() for v in row.values):
-                    header_row = row.values
-                    df_dados = df.iloc[i + 1:]
-                    break
-        if len(header_row) == 0: continue
-        
-        tec_idx, contato_idx, sup_idx, cm_idx, seg_idx = -1, -1, -1, -1, -1
-        dias_idx_map = {}
-        for i, val in enumerate(header_row):
-            v_str = str(val).strip().upper()
-            if 'FUNCION' in v_str: tec_idx = i
-            elif 'CONTATO' in v_str: contato_idx = i
-            elif 'SUPERV' in v_str: sup_idx = i
-            elif v_str in ['CM', 'BASE', 'AREA', 'ÁREA'] or v_str == 'CM_RESPONSAVEL': cm_idx = i
-            elif 'SEGMENTO' in v_str: seg_idx = i
-            else:
-                dia_limpo = None
-                if isinstance(val, (datetime, pd.Timestamp)): dia_limpo = str(val.day)
-                elif v_str.endswith('00:00:00'):
-                    try: dia_limpo = str(pd.to_datetime(v_str).day)
-                    except: pass
-                else:
-                    poss_dia = v_str.split('/')[0].split('.')[0].strip()
-                    if poss_dia.isdigit() and 1 <= int(poss_dia) <= 31: dia_limpo = str(int(poss_dia))
-                if dia_limpo: dias_idx_map[i] = dia_limpo
-
-        for _, row in df_dados.iterrows():
-            row_vals = row.values
-            if tec_idx == -1 or len(row_vals) <= tec_idx: continue
-            tec = str(row_vals[tec_idx]).strip()
-            if not tec or tec.upper() in ['NAN', 'NONE', '', 'FUNCIONÁRIOS', 'FUNCIONARIOS']: continue
-            contato = str(row_vals[contato_idx]).replace('.0', '').replace('nan', '').strip() if contato_idx != -1 and len(row_vals) > contato_idx else ''
-            supervisor = str(row_vals[sup_idx]).replace('nan', '').strip() if sup_idx != -1 and len(row_vals) > sup_idx else ''
-            cm = str(row_vals[cm_idx]).replace('nan', '').strip().upper() if cm_idx != -1 and len(row_vals) > cm_idx else ''
-            segmento = str(row_vals[seg_idx]).replace('nan', '').strip() if seg_idx != -1 and len(row_vals) > seg_idx else 'Não especificado'
-            for d_idx, d_limpo in dias_idx_map.items():
-                if len(row_vals) > d_idx:
-                    plantao_val = str(row_vals[d_idx]).strip().upper()
-                    if plantao_val and plantao_val not in ['F', 'NAN', 'NONE', 'NULL', '', 'C', 'L', 'FE', 'FF']:
-                        chave_unica = f"{aba}_{tec}_{d_limpo}_{mes_ano}"
-                        if chave_unica not in chaves_vistas:
-                            chaves_vistas.add(chave_unica)
-                            all_rows.append((str(aba).upper(), tec, contato, supervisor, cm, segmento, d_limpo, mes_ano, plantao_val))
-
-    if all_rows: execute_values(cursor, "INSERT INTO escala (ddd_aba, tecnico, contato_corp, supervisor, cm, segmento, dia_mes, mes_ano, horario) VALUES %s", all_rows)
-    conn.commit()
-    conn.close()
-
+        with conexao() as conn:
+            cursor = conn.cursor()
+            if progresso: progresso(None, len(dados_insercao))
+            execute_values(cursor, "INSERT INTO sites (sigla, nome_da_localidade, ddd, cm_responsavel) VALUES %s ON CONFLICT (sigla) DO UPDATE SET nome_da_localidade=EXCLUDED.nome_da_localidade, ddd=EXCLUDED.ddd, cm_responsavel=EXCLUDED.cm_responsavel", dados_insercao)
+            data_versions.incrementar(cursor, "sites")
+    _apos_mudanca_sites()
+    return {"sites": len(dados_insercao)}
+
+def process_excel_escala(file_path, progresso=None, mes_ano=None):
+    # Leitura em streaming + melt vetorizado (escala_loader.py), antes de tocar no banco.
+    # O mês de cada coluna vem do cabeçalho (datas); mes_ano (informado no upload) vale para o dia solto.
+    df = escala_loader.ler_escala(file_path, mes_ano, progresso)
+    with conexao() as conn:
+        cursor = conn.cursor()
+        if progresso: progresso(None, len(df))
+        resumo, datas = escala_loader.aplicar_diff(cursor, df, _inicio_do_mes(ESCALA_MESES_RETIDOS))
+        mudou = resumo["inseridos"] or resumo["alterados"] or resumo["removidos"] or resumo["expirados"]
+        if mudou: data_versions.incrementar(cursor, "escala", datas=[d.isoformat() for d in datas])
+    if mudou: _apos_mudanca_escala(datas)
+    return resumo
+
+def _apos_mudanca_sites():
+    search_index.invalidar()
+    query_cache.invalidar(("sites",))
+
+def _apos_mudanca_escala(datas):
+    # Se os nomes (técnicos, bases, abas) não mudaram, um termo continua casando com o mesmo ramo
+    # e basta descartar as respostas das datas alteradas; senão, todo o cache de consultas.
+    # datas None: mudança vista só pela versão (outro worker, aviso perdido), sem saber quais datas.
+    antigo = search_index.atual()
+    search_index.invalidar()
+    if datas is not None and antigo is not None and get_indice_busca().nomes_escala() == antigo.nomes_escala():
+        query_cache.invalidar(("escala",), *[("data", d) for d in datas])
+    else: query_cache.limpar()
+
+def _ao_mudar_escala(detalhe):
+    # Handler do data_versions para escritas de outros workers.
+    if detalhe and detalhe.get("tecnico"): query_cache.invalidar(("tecnico", date.fromisoformat(detalhe["data"]), detalhe["tecnico"]))
+    else: _apos_mudanca_escala([date.fromisoformat(d) for d in detalhe["datas"]] if detalhe and detalhe.get("datas") is not None else None)
+
+data_versions.ao_mudar("sites", lambda detalhe: _apos_mudanca_sites())
+data_versions.ao_mudar("escala", _ao_mudar_escala)
+data_versions.ao_mudar("aviso", lambda detalhe: events.publicar("aviso"))
+
+@metrics.medido("formatacao")
 def formatar_tecnicos(plantoes):
     infra = []
     tx = []
@@ -311,85 +282,283 @@ def formatar_tecnicos(plantoes):
         else: tx.append(tec_info)
     return infra, tx
 
+# Modo paralelo do query_data: os SELECTs de todos os ramos que casaram no índice saem juntos, cada um
+# numa conexão do pool, e o _consultar consome os resultados na ordem de prioridade de sempre.
+# Cada worker do gunicorn abre até CONSULTA_PARALELA_WORKERS conexões a mais: somar no DB_POOL_MAX.
+CONSULTA_PARALELA = os.getenv("CONSULTA_PARALELA", "0") == "1"
+CONSULTA_PARALELA_WORKERS = int(os.getenv("CONSULTA_PARALELA_WORKERS", "3"))
+
 def query_data(user_text, data_consulta=None, nome_usuario="Anônimo"):
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    hoje = datetime.now() - timedelta(hours=3)
-    dia_alvo = data_consulta.split('/')[0] if data_consulta else str(hoje.day)
-    mes_alvo = data_consulta.split('/')[1] if data_consulta and '/' in data_consulta else str(hoje.month)
+    # Respostas completas ficam no query_cache; um hit ainda registra o histórico e o ramo.
     termo = user_text.strip().upper()
-
-    cursor.execute("SELECT DISTINCT ddd_aba FROM escala WHERE ddd_aba ILIKE %s", (f"%{termo}%",))
-    abas_encontradas = [r['ddd_aba'] for r in cursor.fetchall()]
+    data_alvo = _data_alvo(data_consulta)
+    chave = (termo, data_alvo)
+    with metrics.medir_query_data():
+        cacheado, geracao = query_cache.cache.obter(chave)
+        if cacheado is None:
+            if CONSULTA_PARALELA: cacheado, tags = _query_data(None, termo, data_alvo)
+            else:
+                # Uma única conexão do pool por consulta, reaproveitada pelo índice e pelos sites de referência.
+                with conexao() as conn: cacheado, tags = _query_data(conn, termo, data_alvo)
+            if tags is not None: query_cache.cache.guardar(chave, cacheado, tags, geracao)
+        resposta, historico, ramo, base = cacheado
+        save_historico(nome_usuario, *historico, base)
+        metrics.marcar_ramo(ramo)
+    return dict(resposta)
+
+CHAT_LOTE_MAX = int(os.getenv("CHAT_LOTE_MAX", "200"))
+
+def termos_lote(termos):
+    # Termos distintos, na ordem recebida; aceita números vindos do JSON (ex.: DDD 19).
+    return list(dict.fromkeys(str(t).strip().upper() for t in termos if t is not None and str(t).strip()))
+
+def query_data_lote(termos, data_consulta=None, nome_usuario="Anônimo"):
+    # Vários termos numa passada (incidente massivo): mesmo índice e mesma conexão para todos, cada
+    # SELECT distinto (ex.: a escala de uma base) roda uma vez só e o clima das cidades sai em paralelo.
+    # Quem chama valida o limite CHAT_LOTE_MAX (o /chat_batch responde 400 acima dele).
+    termos = termos_lote(termos)
+    data_alvo = _data_alvo(data_consulta)
+    indice = get_indice_busca()
+    linhas, formatados, climas = {}, {}, {}
+
+    def formatar(plantoes):
+        if id(plantoes) not in formatados: formatados[id(plantoes)] = formatar_tecnicos(plantoes)
+        return formatados[id(plantoes)]
+
+    def clima(cidade, rotulo=None):
+        # Marcador trocado pelo texto do clima depois que todas as cidades do lote forem buscadas.
+        return climas.setdefault((cidade, rotulo), f"\x00clima{len(climas)}\x00")
+
+    with conexao() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+        def buscar(sql, params):
+            if (sql, params) not in linhas:
+                cursor.execute(sql, params)
+                linhas[(sql, params)] = cursor.fetchall()
+            return linhas[(sql, params)]
+
+        resultados = []
+        for termo in termos:
+            resposta, base, historico, ramo = _consultar(termo, data_alvo, indice, buscar, formatar, clima)
+            save_historico(nome_usuario, *historico, base)
+            metrics.marcar_ramo(ramo)
+            resultados.append((termo, resposta, base))
+
+    with metrics.etapa("clima"): textos = weather.cache_clima.obter_varios([c for c, _ in climas], weather.CLIMA_ESPERA_LOTE)
+    for (cidade, rotulo), marcador in climas.items():
+        texto = textos.get(cidade, "")
+        if texto and rotulo: texto = texto.replace("Clima Agora:", rotulo)
+        for _, resposta, _ in resultados:
+            if marcador in resposta.get("cabecalho", ""): resposta["cabecalho"] = resposta["cabecalho"].replace(marcador, texto)
+
+    grupos = {}
+    for termo, _, base in resultados: grupos.setdefault(base or "", []).append(termo)
+    return {
+        "resultados": [{"termo": termo, "base": base, "response": resposta} for termo, resposta, base in resultados],
+        "grupos": [{"base": base, "termos": ts} for base, ts in sorted(grupos.items(), key=lambda g: (g[0] == "", g[0]))],
+    }
+
+class DataInvalida(ValueError):
+    pass
+
+def _data_alvo(data_consulta):
+    # "d/m" ou "d/m/aaaa" -> date. Sem ano, vale o ano que deixa a data mais perto de hoje
+    # (em dezembro, "5/1" é janeiro do ano seguinte). Sem data: hoje. Data inválida: DataInvalida
+    # (as rotas respondem 400), nunca a escala de hoje no lugar da data pedida.
+    hoje = (datetime.now() - timedelta(hours=3)).date()
+    if not data_consulta: return hoje
+    partes = [p.strip() for p in str(data_consulta).split('/')]
+    try:
+        dia = int(partes[0])
+        mes = int(partes[1]) if len(partes) > 1 and partes[1] else hoje.month
+        ano = int(partes[2]) if len(partes) > 2 and partes[2] else escala_loader.ano_mais_proximo(mes, hoje.month, hoje.year)
+        if ano < 100: ano += 2000
+        return date(ano, mes, dia)
+    except (ValueError, IndexError, OverflowError):
+        raise DataInvalida(f"Data inválida: {data_consulta}") from None
+
+def _clima_formatado(cidade, rotulo=None):
+    clima_bruto, pendente = get_clima(cidade)
+    return (clima_bruto.replace("Clima Agora:", rotulo) if clima_bruto and rotulo else clima_bruto), pendente
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=CONSULTA_PARALELA_WORKERS, thread_name_prefix="consulta")
+            _executor_pid = os.getpid()
+    return _executor
+
+def _buscar_isolado(sql, params):
+    with conexao() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+def _aquecer_cidade_ref(futuro):
+    # Cidade de referência da base: o clima começa assim que ela chega do banco.
+    if futuro.cancelled() or futuro.exception(): return
+    for r in futuro.result(): weather.cache_clima.aquecer(r['nome_da_localidade'])
+
+def _buscas_em_paralelo(termo, data_alvo, indice):
+    # Dispara de uma vez os SELECTs que o _consultar pode pedir e devolve (buscar, cancelar). O buscar
+    # espera só pelo resultado pedido; o que sobrar quando um ramo de prioridade maior responder é cancelado.
+    consultas, cidade_site = _prever_consultas(termo, data_alvo, indice)
+    # A cidade do site já é conhecida: o clima corre junto com o SELECT da escala.
+    if cidade_site: weather.cache_clima.aquecer(cidade_site)
+    executor = _get_executor()
+    futuros = {}
+    for sql, params in consultas:
+        futuros[(sql, params)] = futuro = executor.submit(_buscar_isolado, sql, params)
+        if sql == SQL_CIDADE_REF: futuro.add_done_callback(_aquecer_cidade_ref)
+
+    def buscar(sql, params):
+        futuro = futuros.get((sql, params))
+        if futuro is None: return _buscar_isolado(sql, params)
+        with metrics.etapa("db_paralelo"): return futuro.result()
+
+    def cancelar():
+        for futuro in futuros.values(): futuro.cancel()
+    return buscar, cancelar
+
+def _query_data(conn, termo, data_alvo):
+    # Devolve ((resposta, histórico, ramo, base), tags do cache). Tags: ("data", d) para uploads de escala,
+    # ("tecnico", d, nome) para o UPDATE do atualizar_tecnico_dinamico e ("sites",) para uploads de sites.
+    # conn None: modo paralelo (CONSULTA_PARALELA), cada SELECT numa conexão própria do pool.
+    tags, clima_pendente = {("data", data_alvo)}, []
+    indice = get_indice_busca()
+    if conn is None:
+        indice = _IndiceMemo(indice)
+        buscar_linhas, cancelar = _buscas_em_paralelo(termo, data_alvo, indice)
+    else:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cancelar = lambda: None
+
+        def buscar_linhas(sql, params):
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def buscar(sql, params):
+        linhas = buscar_linhas(sql, params)
+        tags.update(("tecnico", data_alvo, r['tecnico']) for r in linhas if 'tecnico' in r)
+        return linhas
+
+    def clima(cidade, rotulo=None):
+        texto, pendente = _clima_formatado(cidade, rotulo)
+        if pendente: clima_pendente.append(cidade)
+        return texto
+
+    try: resposta, base, historico, ramo = _consultar(termo, data_alvo, indice, buscar, formatar_tecnicos, clima)
+    finally: cancelar()
+    if ramo not in ("aba", "tecnico"): tags.add(("sites",))
+    # Só fica fora do cache a resposta montada enquanto o primeiro fetch do clima ainda corria; clima vazio
+    # confirmado (cache negativo, OpenWeather fora, site sem cidade) é cacheado como qualquer resposta.
+    return (resposta, historico, ramo, base), (None if clima_pendente else tags)
+
+class _ColecaoMemo:
+    def __init__(self, colecao):
+        self._colecao, self._memo = colecao, {}
+
+    def melhor(self, termo, corte):
+        if (termo, corte) not in self._memo: self._memo[(termo, corte)] = self._colecao.melhor(termo, corte)
+        return self._memo[(termo, corte)]
+
+class _IndiceMemo:
+    # Índice de uma consulta só: o _prever_consultas e o _consultar fazem o mesmo fuzzy uma vez.
+    def __init__(self, indice):
+        self._indice = indice
+        self.tecnicos, self.bases, self.siglas, self.cidades = (_ColecaoMemo(c) for c in (indice.tecnicos, indice.bases, indice.siglas, indice.cidades))
+
+    def __getattr__(self, nome):
+        return getattr(self._indice, nome)
+
+SQL_ESCALA_ABA = "SELECT * FROM escala WHERE ddd_aba IN %s AND data_plantao = %s"
+SQL_ESCALA_TECNICO = "SELECT * FROM escala WHERE tecnico = %s AND data_plantao = %s"
+SQL_ESCALA_BASE = "SELECT * FROM escala WHERE cm = %s AND data_plantao = %s"
+SQL_CIDADE_REF = "SELECT nome_da_localidade FROM sites WHERE cm_responsavel = %s AND nome_da_localidade != '' LIMIT 1"
+SQL_ESCALA_SITE = "SELECT * FROM escala WHERE cm ILIKE %s AND data_plantao = %s"
+
+def _site_do_termo(termo, indice):
+    # (site, ramo) ou (None, None): sigla, depois cidade, depois sigla aproximada.
+    with metrics.etapa("fuzzy"):
+        match_sigla = indice.siglas.melhor(termo, 86)
+        if match_sigla: return indice.sites_por_sigla[match_sigla[0]], "sigla"
+        match_cidade = indice.cidades.melhor(termo, 86)
+        if match_cidade: return indice.sites_por_cidade[match_cidade[0]], "cidade"
+        match_sigla = indice.siglas.melhor(termo, 71)
+        if match_sigla: return indice.sites_por_sigla[match_sigla[0]], "sigla_aproximada"
+    return None, None
+
+def _cm_do_site(site):
+    cm_banco = site.get('cm_responsavel', '').strip()
+    return cm_banco if cm_banco and cm_banco != 'NAN' else site['sigla'][:3]
+
+def _prever_consultas(termo, data_alvo, indice):
+    # Os mesmos casamentos do _consultar, sem parar no primeiro: ([(sql, params)] em ordem de prioridade,
+    # cidade do site ou None). Tem que acompanhar o _consultar, senão o buscar cai no caminho sequencial.
+    consultas = []
+    abas_encontradas = indice.abas_contendo(termo)
+    if abas_encontradas and "CAS" in termo: consultas.append((SQL_ESCALA_ABA, (tuple(abas_encontradas), data_alvo)))
+    with metrics.etapa("fuzzy"):
+        match_tec = indice.tecnicos.melhor(termo, 85)
+        match_base = indice.bases.melhor(termo, 85)
+    if match_tec: consultas.append((SQL_ESCALA_TECNICO, (match_tec[0], data_alvo)))
+    if match_base: consultas += [(SQL_ESCALA_BASE, (match_base[0], data_alvo)), (SQL_CIDADE_REF, (match_base[0],))]
+    site, _ = _site_do_termo(termo, indice)
+    if site: consultas.append((SQL_ESCALA_SITE, (f"%{_cm_do_site(site)}%", data_alvo)))
+    return consultas, site['nome_da_localidade'] if site else None
+
+# Resolve um termo e devolve (resposta no formato do /chat, base usada ou None, (sigla, status) para o
+# histórico, ramo que casou). O acesso a dados vem de fora (buscar/formatar/clima) para que o /chat_batch
+# e o cache de respostas reaproveitem o mesmo caminho; quem chama registra histórico e métricas.
+def _consultar(termo, data_alvo, indice, buscar, formatar, clima):
+    data_txt = f"{data_alvo.day}/{data_alvo.month}"
+    with metrics.etapa("fuzzy"): abas_encontradas = indice.abas_contendo(termo)
     if abas_encontradas and "CAS" in termo:
-        cursor.execute("SELECT * FROM escala WHERE ddd_aba IN %s AND dia_mes = %s", (tuple(abas_encontradas), dia_alvo))
-        plantoes = cursor.fetchall()
+        plantoes = buscar(SQL_ESCALA_ABA, (tuple(abas_encontradas), data_alvo))
         if plantoes:
-            infra, tx = formatar_tecnicos(plantoes)
-            save_historico(nome_usuario, termo, "Localizado (Planilha)")
-            conn.close()
-            return {"encontrado": True, "cabecalho": f"📍 <b>Planilha(s): {', '.join(abas_encontradas)}</b><br>📅 Data: {dia_alvo}/{mes_alvo} | Todos os plantonistas desta aba", "infra": infra, "tx": tx}
-
-    cursor.execute("SELECT DISTINCT tecnico FROM escala WHERE tecnico != ''")
-    tecnicos_db = [r['tecnico'] for r in cursor.fetchall()]
-    match_tec = process.extractOne(termo, tecnicos_db)
-    if match_tec and match_tec[1] >= 85:
-        cursor.execute("SELECT * FROM escala WHERE tecnico = %s AND dia_mes = %s", (match_tec[0], dia_alvo))
-        plantoes = cursor.fetchall()
+            infra, tx = formatar(plantoes)
+            return {"encontrado": True, "cabecalho": f"📍 <b>Planilha(s): {', '.join(abas_encontradas)}</b><br>📅 Data: {data_txt} | Todos os plantonistas desta aba", "infra": infra, "tx": tx}, None, (termo, "Localizado (Planilha)"), "aba"
+
+    with metrics.etapa("fuzzy"): match_tec = indice.tecnicos.melhor(termo, 85)
+    if match_tec:
+        plantoes = buscar(SQL_ESCALA_TECNICO, (match_tec[0], data_alvo))
         if plantoes:
-            infra, tx = formatar_tecnicos(plantoes)
-            save_historico(nome_usuario, match_tec[0], "Localizado (Técnico)")
-            conn.close()
-            return {"encontrado": True, "cabecalho": f"👨‍🔧 <b>Técnico(a): {match_tec[0]}</b><br>📅 Data: {dia_alvo}/{mes_alvo} | Plantões encontrados para este técnico hoje", "infra": infra, "tx": tx}
-
-    cursor.execute("SELECT DISTINCT cm FROM escala WHERE cm != ''")
-    bases_db = [r['cm'] for r in cursor.fetchall()]
-    match_base = process.extractOne(termo, bases_db)
-    if match_base and match_base[1] >= 85: 
+            infra, tx = formatar(plantoes)
+            return {"encontrado": True, "cabecalho": f"👨‍🔧 <b>Técnico(a): {match_tec[0]}</b><br>📅 Data: {data_txt} | Plantões encontrados para este técnico hoje", "infra": infra, "tx": tx}, None, (match_tec[0], "Localizado (Técnico)"), "tecnico"
+
+    with metrics.etapa("fuzzy"): match_base = indice.bases.melhor(termo, 85)
+    if match_base:
         cm_busca = match_base[0]
-        cursor.execute("SELECT * FROM escala WHERE cm = %s AND dia_mes = %s", (cm_busca, dia_alvo))
-        plantoes = cursor.fetchall()
+        plantoes = buscar(SQL_ESCALA_BASE, (cm_busca, data_alvo))
         if plantoes:
-            infra, tx = formatar_tecnicos(plantoes)
-            save_historico(nome_usuario, cm_busca, "Localizado (Região)")
-            cursor.execute("SELECT nome_da_localidade FROM sites WHERE cm_responsavel = %s AND nome_da_localidade != '' LIMIT 1", (cm_busca,))
-            ref_city = cursor.fetchone()
+            infra, tx = formatar(plantoes)
+            ref_city = next(iter(buscar(SQL_CIDADE_REF, (cm_busca,))), None)
             clima_str = ""
             if ref_city and ref_city['nome_da_localidade']:
-                clima_bruto = get_clima(ref_city['nome_da_localidade'])
-                if clima_bruto: clima_str = clima_bruto.replace("Clima Agora:", f"Clima ref. {ref_city['nome_da_localidade'].split('-')[0].strip()}:")
-            conn.close()
-            return {"encontrado": True, "cabecalho": f"📍 <b>Região / Base: {cm_busca}</b><br>📅 Data: {dia_alvo}/{mes_alvo} | Todos os plantonistas da região{clima_str}", "infra": infra, "tx": tx}
-
-    cursor.execute("SELECT sigla, nome_da_localidade, ddd, cm_responsavel FROM sites")
-    sites_db = cursor.fetchall()
-    siglas = [r['sigla'] for r in sites_db]
-    cidades = [r['nome_da_localidade'] for r in sites_db if r['nome_da_localidade']]
-    
-    match_sigla = process.extractOne(termo, siglas)
-    match_cidade = process.extractOne(termo, cidades)
-    
-    site_encontrado = None
-    if match_sigla and match_sigla[1] > 85: site_encontrado = next((s for s in sites_db if s['sigla'] == match_sigla[0]), None)
-    elif match_cidade and match_cidade[1] > 85: site_encontrado = next((s for s in sites_db if s['nome_da_localidade'] == match_cidade[0]), None)
-    elif match_sigla and match_sigla[1] > 70: site_encontrado = next((s for s in sites_db if s['sigla'] == match_sigla[0]), None)
+                clima_str = clima(ref_city['nome_da_localidade'], f"Clima ref. {ref_city['nome_da_localidade'].split('-')[0].strip()}:")
+            return {"encontrado": True, "cabecalho": f"📍 <b>Região / Base: {cm_busca}</b><br>📅 Data: {data_txt} | Todos os plantonistas da região{clima_str}", "infra": infra, "tx": tx}, cm_busca, (cm_busca, "Localizado (Região)"), "base"
 
+    site_encontrado, ramo = _site_do_termo(termo, indice)
     if site_encontrado:
-        cm_banco = site_encontrado.get('cm_responsavel', '').strip()
-        cm_busca = cm_banco if cm_banco and cm_banco != 'NAN' else site_encontrado['sigla'][:3]
-        cursor.execute("SELECT * FROM escala WHERE cm ILIKE %s AND dia_mes = %s", (f"%{cm_busca}%", dia_alvo))
-        plantoes = cursor.fetchall()
-        conn.close()
-        clima_str = get_clima(site_encontrado['nome_da_localidade'])
-        resposta = {"encontrado": True, "cabecalho": f"📍 <b>{site_encontrado['nome_da_localidade']} ({site_encontrado['sigla']})</b><br>📅 Data: {dia_alvo}/{mes_alvo} | DDD: {site_encontrado['ddd']} | Base: {cm_busca}{clima_str}", "infra": [], "tx": []}
+        cm_busca = _cm_do_site(site_encontrado)
+        plantoes = buscar(SQL_ESCALA_SITE, (f"%{cm_busca}%", data_alvo))
+        clima_str = clima(site_encontrado['nome_da_localidade'])
+        resposta = {"encontrado": True, "cabecalho": f"📍 <b>{site_encontrado['nome_da_localidade']} ({site_encontrado['sigla']})</b><br>📅 Data: {data_txt} | DDD: {site_encontrado['ddd']} | Base: {cm_busca}{clima_str}", "infra": [], "tx": []}
         if plantoes:
-            resposta["infra"], resposta["tx"] = formatar_tecnicos(plantoes)
-            save_historico(nome_usuario, site_encontrado['sigla'], "Localizado")
-        else:
-             save_historico(nome_usuario, site_encontrado['sigla'], "Sem cobertura")
-             resposta["erro"] = f"⚠️ Nenhum técnico exclusivo da base <b>{cm_busca}</b> de plantão hoje."
-        return resposta
-    
-    conn.close()
-    save_historico(nome_usuario, termo[:10], "Inválido")
-    return {"encontrado": False, "erro": "Não localizamos Site, Cidade, Técnico ou Base com esse nome."}
+            resposta["infra"], resposta["tx"] = formatar(plantoes)
+            return resposta, cm_busca, (site_encontrado['sigla'], "Localizado"), ramo
+        resposta["erro"] = f"⚠️ Nenhum técnico exclusivo da base <b>{cm_busca}</b> de plantão hoje."
+        return resposta, cm_busca, (site_encontrado['sigla'], "Sem cobertura"), ramo
+
+    return {"encontrado": False, "erro": "Não localizamos Site, Cidade, Técnico ou Base com esse nome."}, None, (termo[:10], "Inválido"), "nao_encontrado"
+
+if __name__ == "__main__":
+    # python database.py -> cria as tabelas e aplica as migrações (passo de deploy, antes de subir o app)
+    init_db()
+    print("Schema em dia.")
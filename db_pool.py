@@ -0,0 +1,149 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+import psycopg2
+import psycopg2.extensions
+from psycopg2 import pool as pg_pool
+import metrics
+
+DB_URL = os.getenv("DATABASE_URL")
+
+# Um pool por processo (cada worker do gunicorn cria o seu após o fork).
+# DB_POOL_MAX deve acompanhar o número de threads do worker (--threads) + threads de fundo: por padrão
+# GUNICORN_THREADS + escritor do histórico, presença, manutenção do historico e jobs de upload
+# (+ CONSULTA_PARALELA_WORKERS com o modo paralelo do query_data ligado).
+THREADS_FUNDO = 3 + int(os.getenv("JOBS_WORKERS", "1"))
+if os.getenv("CONSULTA_PARALELA", "0") == "1": THREADS_FUNDO += int(os.getenv("CONSULTA_PARALELA_WORKERS", "3"))
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", str(int(os.getenv("GUNICORN_THREADS", "16")) + THREADS_FUNDO)))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+DB_POOL_CHECK_IDLE = float(os.getenv("DB_POOL_CHECK_IDLE", "30"))
+
+class _CursorMedido:
+    # Mede cada round-trip (execute_values chama execute por página) para o /metrics.
+    def execute(self, query, vars=None):
+        inicio = time.perf_counter()
+        try: return super().execute(query, vars)
+        finally: metrics.registrar_query(time.perf_counter() - inicio)
+
+    def executemany(self, query, vars_list):
+        inicio = time.perf_counter()
+        try: return super().executemany(query, vars_list)
+        finally: metrics.registrar_query(time.perf_counter() - inicio)
+
+    def copy_expert(self, sql, file, size=8192):
+        inicio = time.perf_counter()
+        try: return super().copy_expert(sql, file, size)
+        finally: metrics.registrar_query(time.perf_counter() - inicio)
+
+_cursores_medidos = {}
+
+def _cursor_medido(factory):
+    if factory not in _cursores_medidos:
+        _cursores_medidos[factory] = type(f"{factory.__name__}Medido", (_CursorMedido, factory), {})
+    return _cursores_medidos[factory]
+
+class ConexaoMedida(psycopg2.extensions.connection):
+    # Vale também para conn.cursor(cursor_factory=RealDictCursor): a factory pedida ganha a medição.
+    def cursor(self, *args, **kwargs):
+        kwargs["cursor_factory"] = _cursor_medido(kwargs.get("cursor_factory") or self.cursor_factory or psycopg2.extensions.cursor)
+        return super().cursor(*args, **kwargs)
+
+class PoolConexoes:
+    def __init__(self, dsn, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX):
+        self.pid = os.getpid()
+        self._pool = pg_pool.ThreadedConnectionPool(minconn, maxconn, dsn, connection_factory=ConexaoMedida)
+        self._vagas = threading.BoundedSemaphore(maxconn)
+        self._meta = {}
+        self._lock = threading.Lock()
+
+    def _saudavel(self, conn):
+        if conn.closed: return False
+        criada, usada = self._meta.get(id(conn), (time.monotonic(), time.monotonic()))
+        agora = time.monotonic()
+        if agora - criada > DB_POOL_MAX_LIFETIME: return False
+        if agora - usada > DB_POOL_CHECK_IDLE:
+            try:
+                cur = conn.cursor(); cur.execute("SELECT 1"); cur.close(); conn.rollback()
+            except psycopg2.Error: return False
+        return True
+
+    def getconn(self):
+        if not self._vagas.acquire(timeout=DB_POOL_TIMEOUT):
+            raise pg_pool.PoolError(f"Nenhuma conexão livre no pool após {DB_POOL_TIMEOUT}s")
+        try:
+            while True:
+                conn = self._pool.getconn()
+                with self._lock: self._meta.setdefault(id(conn), (time.monotonic(), time.monotonic()))
+                if self._saudavel(conn): return conn
+                self._descartar(conn)
+        except Exception:
+            self._vagas.release()
+            raise
+
+    def putconn(self, conn, quebrada=False):
+        try:
+            if quebrada or conn.closed:
+                self._descartar(conn)
+            else:
+                with self._lock:
+                    criada = self._meta.get(id(conn), (time.monotonic(),))[0]
+                    self._meta[id(conn)] = (criada, time.monotonic())
+                self._pool.putconn(conn)
+        finally:
+            self._vagas.release()
+
+    def _descartar(self, conn):
+        with self._lock: self._meta.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+
+    def closeall(self):
+        self._pool.closeall()
+
+_pool = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+def get_pool():
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid(): _pool = PoolConexoes(DB_URL)
+    return _pool
+
+@contextmanager
+def conexao():
+    # Reaproveita a conexão já aberta nesta thread (ex.: query_data -> save_historico),
+    # de modo que uma requisição use uma única conexão e uma única transação.
+    atual = getattr(_local, 'conn', None)
+    if atual is not None:
+        yield atual
+        return
+    p = get_pool()
+    conn = p.getconn()
+    _local.conn = conn
+    _local.apos_commit = []
+    quebrada = False
+    try:
+        yield conn
+        conn.commit()
+        callbacks = _local.apos_commit
+    except Exception as e:
+        quebrada = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+        if not conn.closed:
+            try: conn.rollback()
+            except psycopg2.Error: quebrada = True
+        raise
+    finally:
+        _local.conn = None
+        _local.apos_commit = []
+        p.putconn(conn, quebrada)
+    for fn in callbacks: fn()
+
+def apos_commit(fn):
+    # Executa fn depois do commit da transação corrente (ou já, se não houver conexão aberta
+    # nesta thread), para que avisos/invalidações nunca vejam dados ainda não confirmados.
+    if getattr(_local, 'conn', None) is None: fn()
+    else: _local.apos_commit.append(fn)
@@ -0,0 +1,184 @@
+import io
+import re
+import csv
+from datetime import datetime, timedelta
+# numpy/pandas/openpyxl são importados dentro das funções de leitura: o database importa este módulo
+# (ano_mais_proximo) e o worker não deve pagar pela pilha do Excel antes do primeiro upload.
+
+ABAS_IGNORADAS = ['LEGENDA', 'INSTRUÇÕES', 'RESUMO', 'MENU']
+TECNICOS_INVALIDOS = ['NAN', 'NONE', '', 'FUNCIONÁRIOS', 'FUNCIONARIOS']
+PLANTOES_INVALIDOS = ['F', 'NAN', 'NONE', 'NULL', '', 'C', 'L', 'FE', 'FF']
+COLUNAS = ['ddd_aba', 'tecnico', 'contato_corp', 'supervisor', 'cm', 'segmento', 'dia_mes', 'mes_ano', 'horario']
+
+def ano_mais_proximo(mes, ref_mes, ref_ano):
+    # "5/1" consultado (ou lido) em dezembro é janeiro do ano seguinte, e vice-versa.
+    if mes - ref_mes > 6: return ref_ano - 1
+    if ref_mes - mes > 6: return ref_ano + 1
+    return ref_ano
+
+def mes_informado(texto):
+    # Mês escolhido no upload ("AAAA-MM" do <input type=month>, "MM-AAAA" ou "M/AAAA") -> 'MM-YYYY'.
+    # Vazio: None (o mês sai das colunas datadas da planilha). Formato inválido: ValueError.
+    texto = (texto or "").strip()
+    if not texto: return None
+    m = re.fullmatch(r'(\d{4})-(\d{1,2})', texto)
+    if m: ano, mes = int(m.group(1)), int(m.group(2))
+    else:
+        m = re.fullmatch(r'(\d{1,2})[-/](\d{4})', texto)
+        if not m: raise ValueError(texto)
+        mes, ano = int(m.group(1)), int(m.group(2))
+    if not 1 <= mes <= 12: raise ValueError(texto)
+    return f"{mes:02d}-{ano}"
+
+def _dia_do_cabecalho(val, ref_mes_ano):
+    # (dia, 'MM-YYYY') da coluna; dia solto volta com mês None (resolvido por aba em _resolver_mes).
+    # ref_mes_ano só serve para achar o ano de um "d/m" sem ano.
+    v_str = str(val).strip().upper()
+    # pd.Timestamp é subclasse de datetime.
+    if isinstance(val, datetime): return str(val.day), val.strftime('%m-%Y')
+    if v_str.endswith('00:00:00'):
+        try:
+            import pandas as pd
+            d = pd.to_datetime(v_str)
+            return str(d.day), d.strftime('%m-%Y')
+        except Exception: return None
+    partes = [p.strip() for p in v_str.split('/')]
+    poss_dia = partes[0].split('.')[0].strip()
+    if not (poss_dia.isdigit() and 1 <= int(poss_dia) <= 31): return None
+    if len(partes) >= 2 and partes[1].isdigit() and 1 <= int(partes[1]) <= 12:
+        mes = int(partes[1])
+        ref_mes, ref_ano = (int(x) for x in ref_mes_ano.split('-'))
+        ano = int(partes[2]) if len(partes) >= 3 and partes[2].isdigit() and len(partes[2]) == 4 else ano_mais_proximo(mes, ref_mes, ref_ano)
+        return str(int(poss_dia)), f"{mes:02d}-{ano}"
+    return str(int(poss_dia)), None
+
+def _resolver_mes(aba, dias_idx_map, mes_ano):
+    # Dia solto herda o mês informado no upload ou, sem ele, o das colunas datadas da mesma aba.
+    # Nunca o mês corrente: a escala do mês seguinte com dias soltos sobrescreveria o mês atual.
+    meses = sorted({m for _, m in dias_idx_map.values() if m} | ({mes_ano} if mes_ano else set()))
+    if len(meses) > 1:
+        informado = f" (mês informado no upload: {mes_ano})" if mes_ano else ""
+        raise ValueError(f"Aba {aba}: os dias do cabeçalho caem em mais de um mês ({', '.join(meses)}){informado}. Envie um mês por planilha.")
+    if not meses: raise ValueError(f"Aba {aba}: o cabeçalho só tem o dia, sem o mês. Informe o mês da escala no upload.")
+    return {i: (dia, meses[0]) for i, (dia, _) in dias_idx_map.items()}
+
+def mapear_cabecalho(header_row, ref_mes_ano):
+    idx = {'tec': -1, 'contato': -1, 'sup': -1, 'cm': -1, 'seg': -1}
+    dias_idx_map = {}
+    for i, val in enumerate(header_row):
+        if val is None: continue
+        v_str = str(val).strip().upper()
+        if 'FUNCION' in v_str: idx['tec'] = i
+        elif 'CONTATO' in v_str: idx['contato'] = i
+        elif 'SUPERV' in v_str: idx['sup'] = i
+        elif v_str in ['CM', 'BASE', 'AREA', 'ÁREA'] or v_str == 'CM_RESPONSAVEL': idx['cm'] = i
+        elif 'SEGMENTO' in v_str: idx['seg'] = i
+        else:
+            dia_limpo = _dia_do_cabecalho(val, ref_mes_ano)
+            if dia_limpo: dias_idx_map[i] = dia_limpo
+    return idx, dias_idx_map
+
+def _linhas_apos_cabecalho(ws):
+    # Lê a aba em modo streaming e devolve (cabeçalho, demais linhas) a partir da 1ª linha com 'FUNCION'.
+    linhas = ws.iter_rows(values_only=True)
+    for row in linhas:
+        if row and any(v is not None and 'FUNCION' in str(v).strip().upper() for v in row):
+            return row, linhas
+    return None, iter(())
+
+def normalizar_aba(aba, header_row, linhas, mes_ano):
+    import numpy as np
+    import pandas as pd
+    ref_mes_ano = mes_ano or (datetime.now() - timedelta(hours=3)).strftime('%m-%Y')
+    idx, dias_idx_map = mapear_cabecalho(header_row, ref_mes_ano)
+    if idx['tec'] == -1 or not dias_idx_map: return pd.DataFrame(columns=COLUNAS)
+    dias_idx_map = _resolver_mes(aba, dias_idx_map, mes_ano)
+    largura = len(header_row)
+    df = pd.DataFrame.from_records([tuple(r[:largura]) + (None,) * (largura - len(r)) for r in linhas], columns=range(largura), coerce_float=False)
+    if df.empty: return pd.DataFrame(columns=COLUNAS)
+    df = df.fillna('').astype(str)
+
+    def coluna(chave):
+        return df[idx[chave]] if idx[chave] != -1 else pd.Series('', index=df.index)
+
+    tec = coluna('tec').str.strip()
+    validos = (tec != '') & ~tec.str.upper().isin(TECNICOS_INVALIDOS)
+    if not validos.any(): return pd.DataFrame(columns=COLUNAS)
+    fixos = pd.DataFrame({
+        'tecnico': tec,
+        'contato_corp': coluna('contato').str.replace('.0', '', regex=False).str.replace('nan', '', regex=False).str.strip(),
+        'supervisor': coluna('sup').str.replace('nan', '', regex=False).str.strip(),
+        'cm': coluna('cm').str.replace('nan', '', regex=False).str.strip().str.upper(),
+        'segmento': coluna('seg').str.replace('nan', '', regex=False).str.strip() if idx['seg'] != -1 else pd.Series('Não especificado', index=df.index),
+    })[validos].reset_index(drop=True)
+
+    # Wide -> long em ordem linha a linha (mesma ordem do loop antigo, para o dedupe manter o 1º plantão).
+    dias_cols = list(dias_idx_map)
+    valores = df.loc[validos, dias_cols].to_numpy()
+    n, k = valores.shape
+    longo = fixos.iloc[np.repeat(np.arange(n), k)].reset_index(drop=True)
+    longo['dia_mes'] = np.tile(np.array([dias_idx_map[c][0] for c in dias_cols], dtype=object), n)
+    longo['mes_ano'] = np.tile(np.array([dias_idx_map[c][1] for c in dias_cols], dtype=object), n)
+    # O pandas.read_excel antigo lia 8.0 como 8; aqui o float chega cru e vira '8.0'.
+    longo['horario'] = pd.Series(valores.ravel(), dtype=object).str.strip().str.upper().str.replace(r'^(\d+)\.0$', r'\1', regex=True)
+    longo = longo[~longo['horario'].isin(PLANTOES_INVALIDOS)]
+    longo = longo.drop_duplicates(subset=['tecnico', 'dia_mes', 'mes_ano'], keep='first')
+    longo['ddd_aba'] = str(aba).upper()
+    return longo[COLUNAS]
+
+def ler_escala(file_path, mes_ano=None, progresso=None):
+    # mes_ano: mês informado no upload ('MM-YYYY') ou None; ver _resolver_mes.
+    import pandas as pd
+    from openpyxl import load_workbook
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        partes = []
+        for aba in wb.sheetnames:
+            if aba.strip().upper() in ABAS_IGNORADAS: continue
+            header_row, linhas = _linhas_apos_cabecalho(wb[aba])
+            if header_row is None: continue
+            parte = normalizar_aba(aba, header_row, linhas, mes_ano)
+            partes.append(parte)
+            if progresso: progresso(aba, len(parte))
+        return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=COLUNAS)
+    finally:
+        wb.close()
+
+def copiar_para_tabela(cursor, df, tabela='escala'):
+    if df.empty: return 0
+    buf = io.StringIO()
+    # QUOTE_ALL: no COPY csv, "" é string vazia e não NULL (as consultas usam tecnico != '').
+    df.to_csv(buf, index=False, header=False, quoting=csv.QUOTE_ALL)
+    buf.seek(0)
+    cursor.copy_expert(f"COPY {tabela} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+    return len(df)
+
+CHAVE = ['ddd_aba', 'tecnico', 'dia_mes', 'mes_ano']
+VALORES = ['contato_corp', 'supervisor', 'cm', 'segmento', 'horario']
+
+def aplicar_diff(cursor, df, manter_desde=None):
+    # Carrega a planilha numa tabela temporária e aplica só o que mudou, tudo na transação corrente:
+    # quem consulta durante o upload continua vendo a escala antiga até o commit.
+    # Só os meses presentes na planilha são substituídos; os demais (ex.: o mês seguinte já carregado) ficam.
+    # manter_desde (date): plantões anteriores a ela saem na mesma transação (retenção da escala).
+    meses = sorted(df['mes_ano'].unique()) if not df.empty else []
+    cursor.execute(f"CREATE TEMP TABLE escala_staging ({', '.join(c + ' TEXT' for c in COLUNAS)}) ON COMMIT DROP")
+    copiar_para_tabela(cursor, df, 'escala_staging')
+    junta = " AND ".join(f"e.{c} = s.{c}" for c in CHAVE)
+    # RETURNING data_plantao: as datas tocadas servem para invalidar só as respostas em cache dessas datas.
+    datas = set()
+    cursor.execute(f"DELETE FROM escala e WHERE e.mes_ano = ANY(%s) AND NOT EXISTS (SELECT 1 FROM escala_staging s WHERE {junta}) RETURNING e.data_plantao", (meses,))
+    removidos = cursor.rowcount
+    datas.update(r[0] for r in cursor.fetchall())
+    cursor.execute(f"UPDATE escala e SET {', '.join(f'{c} = s.{c}' for c in VALORES)} FROM escala_staging s WHERE {junta} AND ({', '.join('e.' + c for c in VALORES)}) IS DISTINCT FROM ({', '.join('s.' + c for c in VALORES)}) RETURNING e.data_plantao")
+    alterados = cursor.rowcount
+    datas.update(r[0] for r in cursor.fetchall())
+    cursor.execute(f"INSERT INTO escala ({', '.join(COLUNAS)}) SELECT {', '.join('s.' + c for c in COLUNAS)} FROM escala_staging s WHERE NOT EXISTS (SELECT 1 FROM escala e WHERE {junta}) RETURNING data_plantao")
+    inseridos = cursor.rowcount
+    datas.update(r[0] for r in cursor.fetchall())
+    expirados = 0
+    if manter_desde:
+        cursor.execute("DELETE FROM escala WHERE data_plantao < %s RETURNING data_plantao", (manter_desde,))
+        expirados = cursor.rowcount
+        datas.update(r[0] for r in cursor.fetchall())
+    return {"inseridos": inseridos, "alterados": alterados, "removidos": removidos, "expirados": expirados, "meses": meses}, sorted(d for d in datas if d)
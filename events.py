@@ -0,0 +1,54 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+# Por quanto tempo (s) um worker confia no snapshot em memória antes de reler o banco.
+# Escritas feitas neste worker invalidam na hora; as de outros workers aparecem em até EVENTOS_TTL.
+EVENTOS_TTL = float(os.getenv("EVENTOS_TTL", "5"))
+EVENTOS_HEARTBEAT = float(os.getenv("EVENTOS_HEARTBEAT", "15"))
+# Duração máxima de um stream SSE; o EventSource do navegador reconecta sozinho.
+EVENTOS_MAX_DURACAO = float(os.getenv("EVENTOS_MAX_DURACAO", "300"))
+
+_mudanca = threading.Condition()
+_topicos = {}
+
+class Topico:
+    def __init__(self, nome, carregar, ttl=EVENTOS_TTL):
+        self.nome, self.carregar, self.ttl = nome, carregar, ttl
+        self._valor, self._etag, self._lido_em = None, None, 0.0
+        self._lock = threading.Lock()
+        _topicos[nome] = self
+
+    def atual(self):
+        with self._lock:
+            if self._etag is None or time.monotonic() - self._lido_em >= self.ttl:
+                valor = self.carregar()
+                corpo = json.dumps(valor, sort_keys=True, ensure_ascii=False, default=str)
+                self._valor, self._etag = valor, hashlib.sha1(corpo.encode()).hexdigest()
+                self._lido_em = time.monotonic()
+            return self._valor, self._etag
+
+    def invalidar(self):
+        with self._lock: self._lido_em = 0.0
+
+def publicar(nome):
+    topico = _topicos.get(nome)
+    if topico: topico.invalidar()
+    with _mudanca: _mudanca.notify_all()
+
+def stream(nomes, max_duracao=EVENTOS_MAX_DURACAO, heartbeat=EVENTOS_HEARTBEAT):
+    enviados = {}
+    inicio = ultimo_envio = time.monotonic()
+    while time.monotonic() - inicio < max_duracao:
+        for nome in nomes:
+            valor, etag = _topicos[nome].atual()
+            if enviados.get(nome) != etag:
+                enviados[nome] = etag
+                ultimo_envio = time.monotonic()
+                yield f"event: {nome}\nid: {etag}\ndata: {json.dumps(valor, ensure_ascii=False, default=str)}\n\n"
+        if time.monotonic() - ultimo_envio >= heartbeat:
+            ultimo_envio = time.monotonic()
+            yield ": ping\n\n"
+        with _mudanca: _mudanca.wait(timeout=min(EVENTOS_TTL, heartbeat))
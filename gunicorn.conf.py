@@ -0,0 +1,20 @@
+import os
+
+# Lido automaticamente pelo `gunicorn main:app`.
+# Workers gthread: streams SSE (/eventos, /chat_ia_stream) ocupam uma thread, não o worker inteiro.
+# Com EVENTOS_SSE=1 cada aba aberta prende uma thread por até EVENTOS_MAX_DURACAO: dimensionar
+# WEB_CONCURRENCY x GUNICORN_THREADS >= abas abertas + folga para /chat (ex.: 120 abas -> 4 x 48).
+# O pool do banco (DB_POOL_MAX) acompanha GUNICORN_THREADS por padrão (ver db_pool.py).
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "16"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+
+def on_starting(server):
+    # Schema criado/migrado uma vez no master, antes do fork: os workers sobem sem DDL.
+    # As conexões abertas aqui são fechadas para não serem herdadas pelos workers.
+    import database
+    import db_pool
+    database.init_db()
+    db_pool.get_pool().closeall()
@@ -0,0 +1,119 @@
+import os
+import sys
+import time
+import threading
+from datetime import datetime, timedelta
+from psycopg2.extras import RealDictCursor
+from db_pool import conexao
+
+# Manutenção do historico: consolida as consultas por hora em historico_horario (base das
+# estatísticas do admin) e poda, em lotes, as linhas já consolidadas mais velhas que a retenção.
+# Roda numa thread de cada worker, mas um advisory lock garante uma execução por vez no cluster.
+HISTORICO_RETENCAO_DIAS = int(os.getenv("HISTORICO_RETENCAO_DIAS", "90"))
+HISTORICO_PODA_LOTE = int(os.getenv("HISTORICO_PODA_LOTE", "5000"))
+HISTORICO_ARQUIVAR = os.getenv("HISTORICO_ARQUIVAR", "0") == "1"
+HISTORICO_MANUTENCAO_INTERVALO = float(os.getenv("HISTORICO_MANUTENCAO_INTERVALO", "600"))
+# O write-behind grava com alguns segundos de atraso; a hora só é fechada depois dessa folga.
+FOLGA_CONSOLIDACAO = timedelta(minutes=5)
+STATUS_SITE = ('Localizado', 'Sem cobertura')
+
+def consolidar():
+    # Agrega as horas fechadas desde a última execução. A marca (historico_consolidado.ate) e os
+    # totais andam na mesma transação, então uma falha no meio não conta nada duas vezes.
+    with conexao() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_try_advisory_xact_lock(hashtext('spi_historico_consolidar'))")
+        if not cursor.fetchone()[0]: return 0
+        cursor.execute("SELECT ate FROM historico_consolidado WHERE id = 1 FOR UPDATE")
+        desde = cursor.fetchone()[0]
+        cursor.execute("SELECT date_trunc('hour', CURRENT_TIMESTAMP - %s)", (FOLGA_CONSOLIDACAO,))
+        ate = cursor.fetchone()[0]
+        if desde is not None and desde >= ate: return 0
+        cursor.execute("""INSERT INTO historico_horario (hora, sigla, base, status, usuario, total)
+            SELECT date_trunc('hour', data), COALESCE(sigla, ''), COALESCE(base, ''), COALESCE(status, ''), COALESCE(usuario, ''), COUNT(*)
+            FROM historico WHERE data >= COALESCE(%s, '-infinity'::timestamp) AND data < %s
+            GROUP BY 1, 2, 3, 4, 5
+            ON CONFLICT (hora, sigla, base, status, usuario) DO UPDATE SET total = historico_horario.total + EXCLUDED.total""", (desde, ate))
+        agregados = cursor.rowcount
+        cursor.execute("UPDATE historico_consolidado SET ate = %s WHERE id = 1", (ate,))
+    return agregados
+
+def podar(retencao_dias=HISTORICO_RETENCAO_DIAS, lote=HISTORICO_PODA_LOTE, arquivar=HISTORICO_ARQUIVAR):
+    # Um lote por transação para não segurar locks longos; só apaga o que já foi consolidado.
+    if retencao_dias <= 0: return 0
+    total = 0
+    while True:
+        with conexao() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT pg_try_advisory_xact_lock(hashtext('spi_historico_podar'))")
+            if not cursor.fetchone()[0]: return total
+            # LEAST ignora NULL: sem nenhuma consolidação ainda (ate NULL) não há nada que possa ser apagado.
+            cursor.execute("SELECT ate, LEAST(CURRENT_TIMESTAMP - %s * INTERVAL '1 day', ate) FROM historico_consolidado WHERE id = 1", (retencao_dias,))
+            row = cursor.fetchone()
+            if row is None or row[0] is None: return total
+            limite = row[1]
+            velhos = "SELECT id FROM historico WHERE data < %s ORDER BY data LIMIT %s"
+            if arquivar:
+                cursor.execute(f"""WITH apagados AS (DELETE FROM historico WHERE id IN ({velhos}) RETURNING id, usuario, sigla, status, base, data),
+                    arquivados AS (INSERT INTO historico_arquivo (id, usuario, sigla, status, base, data) SELECT * FROM apagados ON CONFLICT (id) DO NOTHING)
+                    SELECT COUNT(*) FROM apagados""", (limite, lote))
+                apagados = cursor.fetchone()[0]
+            else:
+                cursor.execute(f"DELETE FROM historico WHERE id IN ({velhos})", (limite, lote))
+                apagados = cursor.rowcount
+        total += apagados
+        if apagados < lote: return total
+
+def executar():
+    return {"consolidados": consolidar(), "podados": podar()}
+
+def estatisticas(dias=7, limite=10):
+    # Lê só o agregado horário (horas fechadas); a hora corrente entra na próxima consolidação.
+    desde = datetime.now() - timedelta(days=dias)
+    with conexao() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("SELECT sigla, SUM(total) AS total FROM historico_horario WHERE hora >= %s AND status IN %s GROUP BY sigla ORDER BY total DESC, sigla LIMIT %s", (desde, STATUS_SITE, limite))
+        sites = cursor.fetchall()
+        cursor.execute("SELECT base, SUM(total) AS total FROM historico_horario WHERE hora >= %s AND base != '' GROUP BY base ORDER BY total DESC, base LIMIT %s", (desde, limite))
+        bases = cursor.fetchall()
+        cursor.execute("SELECT usuario, SUM(total) AS total FROM historico_horario WHERE hora >= %s GROUP BY usuario ORDER BY total DESC, usuario LIMIT %s", (desde, limite))
+        usuarios = cursor.fetchall()
+        cursor.execute("SELECT status, SUM(total) AS total FROM historico_horario WHERE hora >= %s GROUP BY status ORDER BY total DESC", (desde,))
+        por_status = cursor.fetchall()
+        cursor.execute("SELECT date_trunc('day', hora) AS dia, SUM(total) AS total FROM historico_horario WHERE hora >= %s GROUP BY 1 ORDER BY 1", (desde,))
+        por_dia = cursor.fetchall()
+        cursor.execute("SELECT ate FROM historico_consolidado WHERE id = 1")
+        ate = cursor.fetchone()
+    return {
+        "dias": dias,
+        "consolidado_ate": ate['ate'].isoformat() if ate and ate['ate'] else None,
+        "sites": [{"sigla": r['sigla'], "total": int(r['total'])} for r in sites],
+        "bases": [{"base": r['base'], "total": int(r['total'])} for r in bases],
+        "usuarios": [{"usuario": r['usuario'], "total": int(r['total'])} for r in usuarios],
+        "status": [{"status": r['status'], "total": int(r['total'])} for r in por_status],
+        "por_dia": [{"dia": r['dia'].strftime('%d/%m/%Y'), "total": int(r['total'])} for r in por_dia],
+    }
+
+_thread = None
+_pid = None
+_lock = threading.Lock()
+
+def _loop():
+    while True:
+        try: executar()
+        except Exception: pass
+        time.sleep(HISTORICO_MANUTENCAO_INTERVALO)
+
+def iniciar():
+    global _thread, _pid
+    if HISTORICO_MANUTENCAO_INTERVALO <= 0 or (_thread is not None and _pid == os.getpid()): return
+    with _lock:
+        if _thread is not None and _pid == os.getpid(): return
+        _pid = os.getpid()
+        _thread = threading.Thread(target=_loop, name="historico-manutencao", daemon=True)
+        _thread.start()
+
+if __name__ == "__main__":
+    # python history_rollup.py -> consolida e poda uma vez (ex.: via cron, com HISTORICO_MANUTENCAO_INTERVALO=0 no app)
+    print(executar())
+    if "--estatisticas" in sys.argv: print(estatisticas())
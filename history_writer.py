@@ -0,0 +1,91 @@
+import os
+import time
+import queue
+import atexit
+import threading
+from psycopg2.extras import execute_values
+from db_pool import conexao
+import events
+
+# Write-behind do histórico: /chat só enfileira, a gravação é feita em lote por uma thread.
+HISTORICO_LOTE = int(os.getenv("HISTORICO_LOTE", "100"))
+HISTORICO_INTERVALO = float(os.getenv("HISTORICO_INTERVALO", "1"))
+HISTORICO_FILA_MAX = int(os.getenv("HISTORICO_FILA_MAX", "10000"))
+
+class EscritorHistorico:
+    def __init__(self, lote=HISTORICO_LOTE, intervalo=HISTORICO_INTERVALO, fila_max=HISTORICO_FILA_MAX):
+        self.lote, self.intervalo, self.fila_max = lote, intervalo, fila_max
+        self._fila = queue.Queue(maxsize=fila_max)
+        self._pendentes = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.RLock()
+        self._thread = None
+        self._pid = None
+        self.stats = {"enfileirados": 0, "gravados": 0, "descartados": 0, "falhas": 0, "lotes": 0}
+
+    def _garantir_thread(self):
+        if self._thread is not None and self._pid == os.getpid(): return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid(): return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name="historico-writer", daemon=True)
+            self._thread.start()
+
+    def enviar(self, usuario, sigla, status, base=None):
+        try:
+            self._fila.put_nowait((usuario, sigla, status, base or '', time.time()))
+            self.stats["enfileirados"] += 1
+        except queue.Full:
+            self.stats["descartados"] += 1
+        self._garantir_thread()
+
+    def _loop(self):
+        while True:
+            limite = time.monotonic() + self.intervalo
+            novos = []
+            while len(novos) < self.lote:
+                restante = limite - time.monotonic()
+                if restante <= 0: break
+                try: novos.append(self._fila.get(timeout=restante))
+                except queue.Empty: break
+            with self._flush_lock: self._pendentes.extend(novos)
+            try: self.flush()
+            except Exception: time.sleep(self.intervalo)
+
+    def _drenar(self):
+        while True:
+            try: self._pendentes.append(self._fila.get_nowait())
+            except queue.Empty: return
+
+    def flush(self):
+        with self._flush_lock:
+            self._drenar()
+            if not self._pendentes: return 0
+            excesso = len(self._pendentes) - self.fila_max
+            if excesso > 0:
+                del self._pendentes[:excesso]
+                self.stats["descartados"] += excesso
+            agora = time.time()
+            lote = [(u, s, st, b, agora - t) for u, s, st, b, t in self._pendentes]
+            try:
+                with conexao() as conn:
+                    cursor = conn.cursor()
+                    execute_values(cursor, "INSERT INTO historico (usuario, sigla, status, base, data) VALUES %s", lote, template="(%s, %s, %s, %s, CURRENT_TIMESTAMP - %s * INTERVAL '1 second')", page_size=self.lote)
+            except Exception:
+                self.stats["falhas"] += 1
+                raise
+            self._pendentes = []
+            self.stats["gravados"] += len(lote)
+            self.stats["lotes"] += 1
+        events.publicar("historico")
+        return len(lote)
+
+    def status(self):
+        return dict(self.stats, backlog=self._fila.qsize() + len(self._pendentes))
+
+escritor = EscritorHistorico()
+
+@atexit.register
+def _flush_final():
+    try: escritor.flush()
+    except Exception: pass
@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from psycopg2.extras import RealDictCursor
+from db_pool import conexao
+
+# Uploads de planilha rodam fora da requisição. O estado fica na tabela upload_jobs para que
+# /admin/jobs/<id> responda de qualquer worker do gunicorn, não só do que executa o job.
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "1"))
+# Cada worker renova a "batida" dos seus jobs na fila/em execução a cada JOBS_BATIDA s; um job sem
+# batida há JOBS_BATIDA_LIMITE s morreu com o worker (restart, kill) e é marcado como erro.
+JOBS_BATIDA = float(os.getenv("JOBS_BATIDA", "15"))
+JOBS_BATIDA_LIMITE = float(os.getenv("JOBS_BATIDA_LIMITE", "120"))
+MSG_INTERROMPIDO = "Processamento interrompido (o servidor reiniciou durante o upload). Envie a planilha de novo."
+
+class JobCancelado(Exception):
+    pass
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+_ativos = set()
+
+def _get_executor():
+    global _executor, _executor_pid
+    with _lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=JOBS_WORKERS, thread_name_prefix="upload-job")
+            _executor_pid = os.getpid()
+            _ativos.clear()
+            threading.Thread(target=_bater, name="upload-job-batida", daemon=True).start()
+    return _executor
+
+def _bater():
+    while True:
+        time.sleep(JOBS_BATIDA)
+        with _lock: ids = list(_ativos)
+        if not ids: continue
+        try:
+            with conexao() as conn:
+                conn.cursor().execute("UPDATE upload_jobs SET batida = CURRENT_TIMESTAMP WHERE id = ANY(%s)", (ids,))
+        except Exception: pass
+
+def _varrer(cursor):
+    cursor.execute("""UPDATE upload_jobs SET status = 'erro', erro = %s, fim = CURRENT_TIMESTAMP
+        WHERE status IN ('na_fila', 'executando') AND COALESCE(batida, criado_em) < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'""", (MSG_INTERROMPIDO, JOBS_BATIDA_LIMITE))
+
+def _atualizar(job_id, carimbo=None, **campos):
+    # Um job cancelado (substituído) não muda mais de estado, nem para erro.
+    sets = [f"{c} = %s" for c in campos] + ([f"{carimbo} = CURRENT_TIMESTAMP"] if carimbo else [])
+    with conexao() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"UPDATE upload_jobs SET {', '.join(sets)} WHERE id = %s AND status != 'cancelado'", (*campos.values(), job_id))
+
+def _status_atual(job_id):
+    with conexao() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT status FROM upload_jobs WHERE id = %s", (job_id,))
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+def enviar(tipo, funcao, file_path):
+    # Um novo upload do mesmo tipo substitui qualquer job anterior ainda na fila ou em execução.
+    job_id = uuid.uuid4().hex
+    executor = _get_executor()
+    with conexao() as conn:
+        cursor = conn.cursor()
+        _varrer(cursor)
+        cursor.execute("UPDATE upload_jobs SET status = 'cancelado', erro = 'Substituído por um upload mais recente', fim = CURRENT_TIMESTAMP WHERE tipo = %s AND status IN ('na_fila', 'executando')", (tipo,))
+        cursor.execute("INSERT INTO upload_jobs (id, tipo, arquivo, status, batida) VALUES (%s, %s, %s, 'na_fila', CURRENT_TIMESTAMP)", (job_id, tipo, os.path.basename(file_path)))
+    with _lock: _ativos.add(job_id)
+    executor.submit(_executar, job_id, tipo, funcao, file_path)
+    return job_id
+
+def _executar(job_id, tipo, funcao, file_path):
+    try: _executar_job(job_id, tipo, funcao, file_path)
+    finally:
+        with _lock: _ativos.discard(job_id)
+        # Cada upload é salvo com nome único (main.enfileirar_upload): o arquivo é só deste job.
+        try: os.remove(file_path)
+        except OSError: pass
+
+def _executar_job(job_id, tipo, funcao, file_path):
+    if _status_atual(job_id) == 'cancelado': return
+    _atualizar(job_id, 'inicio', status='executando')
+    abas = []
+
+    def progresso(aba, linhas):
+        # aba=None: chamado dentro da transação de gravação. O advisory lock serializa as gravações
+        # do mesmo tipo e a checagem garante que um job substituído nunca sobrescreva o mais novo.
+        if aba is None:
+            with conexao() as conn:
+                conn.cursor().execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"upload_{tipo}",))
+            if _status_atual(job_id) == 'cancelado': raise JobCancelado()
+            return
+        abas.append({"aba": aba, "linhas": linhas})
+        if _status_atual(job_id) == 'cancelado': raise JobCancelado()
+        _atualizar(job_id, progresso=json.dumps(abas, ensure_ascii=False), linhas=sum(a["linhas"] for a in abas))
+
+    try:
+        resultado = funcao(file_path, progresso=progresso)
+        _atualizar(job_id, 'fim', status='concluido', resultado=json.dumps(resultado or {}, ensure_ascii=False))
+    except JobCancelado:
+        pass
+    except Exception as e:
+        _atualizar(job_id, 'fim', status='erro', erro=str(e))
+
+def status(job_id):
+    with conexao() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        _varrer(cursor)
+        cursor.execute("SELECT id, tipo, arquivo, status, progresso, linhas, resultado, erro, criado_em, inicio, fim FROM upload_jobs WHERE id = %s", (job_id,))
+        row = cursor.fetchone()
+    if not row: return None
+    row = dict(row)
+    row['progresso'] = json.loads(row['progresso'] or '[]')
+    row['resultado'] = json.loads(row['resultado']) if row['resultado'] else None
+    for c in ('criado_em', 'inicio', 'fim'):
+        row[c] = row[c].isoformat() if row[c] else None
+    return row
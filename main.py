@@ -1,111 +1,126 @@
 import os
-from flask import Flask, render_template, request, jsonify, session
+import json
+import uuid
+import functools
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context
 from werkzeug.utils import secure_filename
-import google.generativeai as genai
-from database import init_db, process_excel_sites, process_excel_escala, query_data, save_suggestion, get_suggestions, get_historico, ping_user, get_online_users, get_all_tecnicos, get_autocomplete_data, set_aviso, get_aviso, get_visao_geral, atualizar_tecnico_dinamico
+import ai
+import data_versions
+import events
+import history_rollup
+import history_writer
+import jobs
+import metrics
+import query_cache
+import weather
+from escala_loader import mes_informado
+from database import init_db, process_excel_sites, process_excel_escala, query_data, query_data_lote, termos_lote, CHAT_LOTE_MAX, DataInvalida, save_suggestion, get_suggestions, get_historico, ping_user, get_online_users, get_all_tecnicos, get_indice_busca, set_aviso, get_aviso, get_visao_geral
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SECRET_KEY", "chave_secreta_spi_2026")
 UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-init_db()
-
-# --- CONFIGURAÇÃO SEGURA DA IA DO GOOGLE ---
-# Agora ele puxa a chave do cofre do Render, protegendo contra o bloqueio do GitHub!
-GEMINI_KEY = os.environ.get("GEMINI_API_KEY")
-if GEMINI_KEY:
-    genai.configure(api_key=GEMINI_KEY)
+# O schema é criado/migrado uma vez antes dos workers subirem (on_starting no gunicorn.conf.py, ou
+# `python database.py`). INIT_DB_NA_IMPORTACAO=1 volta a rodar o init_db em cada importação
+# (servidores WSGI sem esse hook).
+if os.environ.get("INIT_DB_NA_IMPORTACAO", "0") == "1": init_db()
+
+# Snapshots compartilhados por todas as abas deste worker (ver events.py).
+TOPICO_HISTORICO = events.Topico("historico", get_historico)
+TOPICO_AVISO = events.Topico("aviso", lambda: {"aviso": get_aviso()})
+# SSE segura uma thread por aba aberta durante até EVENTOS_MAX_DURACAO: desligado por padrão (as abas
+# fazem polling com ETag). Só ligar com workers x GUNICORN_THREADS acima do número de abas (ver gunicorn.conf.py).
+EVENTOS_SSE = os.environ.get("EVENTOS_SSE", "0") == "1"
+
+# Métricas por requisição (metrics.py). Com METRICAS_TOKEN definido, /metrics exige "Authorization: Bearer <token>".
+METRICAS_TOKEN = os.environ.get("METRICAS_TOKEN")
+metrics.COLETORES.append(lambda: metrics.linhas_contadores("spi_clima_cache_total", "Cache de clima por resultado", weather.cache_clima.stats))
+metrics.COLETORES.append(lambda: metrics.linhas_contadores("spi_consulta_cache_total", "Cache de respostas do query_data por resultado", query_cache.cache.stats))
+metrics.COLETORES.append(lambda: metrics.linhas_contadores("spi_listas_cache_total", "Cache de visão geral e lista de técnicos por resultado", query_cache.listas.stats))
+metrics.COLETORES.append(lambda: metrics.linhas_contadores("spi_versoes_dados_total", "Avisos de mudança de dados recebidos pelo worker", data_versions.stats))
+metrics.COLETORES.append(lambda: metrics.linhas_contadores("spi_ia_cache_total", "Cache de respostas do /chat_ia por resultado", ai.cache_ia.stats))
+metrics.COLETORES.append(lambda: metrics.linhas_contadores("spi_historico_fila", "Estado do write-behind do histórico", history_writer.escritor.status(), tipo="gauge"))
+
+@app.before_request
+def iniciar_metricas():
+    metrics.iniciar_requisicao(request.url_rule.rule if request.url_rule else "nao_encontrada")
+    # Consolidação/poda do historico (history_rollup.py) e listener de versões dos dados
+    # (data_versions.py); sobem uma vez por worker, depois do fork.
+    history_rollup.iniciar()
+    data_versions.iniciar()
+
+@app.after_request
+def finalizar_metricas(resp):
+    metrics.finalizar_requisicao(request.method, resp.status_code)
+    return resp
+
+@app.route("/metrics", methods=["GET"])
+def exportar_metricas():
+    if METRICAS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICAS_TOKEN}": return jsonify({"erro": "Não autorizado"}), 401
+    return Response(metrics.exportar(), mimetype="text/plain; version=0.0.4")
+
+def resposta_condicional(topico):
+    valor, etag = topico.atual()
+    resp = jsonify(valor)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
 
 @app.route("/")
 def index():
-    return render_template("index.html")
+    return render_template("index.html", eventos_sse=EVENTOS_SSE)
 
 @app.route("/chat", methods=["POST"])
 def chat():
     dados = request.json
     if not dados.get("message"): return jsonify({"error": "Mensagem vazia"}), 400
-    resultado = query_data(dados.get("message"), dados.get("data"), dados.get("nome", "Anônimo"))
+    try: resultado = query_data(dados.get("message"), dados.get("data"), dados.get("nome", "Anônimo"))
+    except DataInvalida as e: return jsonify({"error": str(e)}), 400
     return jsonify({"response": resultado})
 
-# --- ROTA DE INTELIGÊNCIA ARTIFICIAL (AUTO-DISCOVERY DE MODELOS) ---
+@app.route("/chat_batch", methods=["POST"])
+def chat_batch():
+    dados = request.json
+    termos = dados.get("terms") or []
+    if isinstance(termos, str): termos = termos.replace(';', ',').replace('\n', ',').split(',')
+    if not isinstance(termos, list): return jsonify({"error": "terms deve ser uma lista ou texto separado por vírgulas"}), 400
+    termos = termos_lote(termos)
+    if not termos: return jsonify({"error": "Lista de termos vazia"}), 400
+    if len(termos) > CHAT_LOTE_MAX: return jsonify({"error": f"No máximo {CHAT_LOTE_MAX} termos por lote (recebidos {len(termos)})"}), 400
+    try: return jsonify(query_data_lote(termos, dados.get("data"), dados.get("nome", "Anônimo")))
+    except DataInvalida as e: return jsonify({"error": str(e)}), 400
+
+# --- ROTA DE INTELIGÊNCIA ARTIFICIAL (MODELO DESCOBERTO UMA VEZ POR PROCESSO, VER ai.py) ---
 @app.route("/chat_ia", methods=["POST"])
 def chat_ia():
     dados = request.json
-    mensagem_usuario = dados.get("message")
-    
-    if not GEMINI_KEY:
-        return jsonify({"texto": "A chave da API da IA não foi configurada nas variáveis de ambiente do servidor Render."})
-
-    try:
-        # 1. PERGUNTA AO GOOGLE QUAIS MODELOS ESSA CHAVE TEM ACESSO
-        modelos_disponiveis = []
-        for m in genai.list_models():
-            if 'generateContent' in m.supported_generation_methods:
-                nome_limpo = m.name.replace('models/', '')
-                modelos_disponiveis.append(nome_limpo)
-        
-        if not modelos_disponiveis:
-            return jsonify({"texto": "Erro: A sua chave de API do Google é válida, mas não tem permissão para usar nenhum modelo de texto no momento."})
-        
-        # 2. ESCOLHE O MELHOR MODELO AUTOMATICAMENTE
-        modelo_escolhido = modelos_disponiveis[0] 
-        
-        preferencias = ['gemini-1.5-flash', 'gemini-1.5-flash-latest', 'gemini-flash-latest', 'gemini-1.5-pro', 'gemini-1.0-pro', 'gemini-pro']
-        for pref in preferencias:
-            if pref in modelos_disponiveis:
-                modelo_escolhido = pref
-                break
-        
-        # 3. INSTANCIA O MODELO GARANTIDO QUE EXISTE NA SUA CONTA
-        model = genai.GenerativeModel(modelo_escolhido)
-        
-        prompt_sistema = """Você é um Assistente Sênior de NOC (Network Operations Center) especializado em Telecom e Infraestrutura.
-        Sua missão é ajudar analistas a traduzirem logs complexos e acionarem as equipes de campo. Use formatação HTML <b> para negrito e <ul><li> para listas.
-
-        1. ANÁLISE DE ALARMES: 
-        Sempre que o usuário colar um alarme (log de equipamento, energia, temperatura, LOS, BGP, etc) ou perguntar sobre um, você DEVE estruturar sua resposta EXATAMENTE assim:
-        
-        <b>🔴 O que está acontecendo:</b><br>
-        (Escreva 1 ou 2 parágrafos explicando de forma simples e direta o que o alarme significa, o que falhou e qual o possível impacto na rede).<br><br>
-        
-        <b>🛠️ O que falar para o técnico:</b><br>
-        (Escreva uma mensagem pronta, educada e direta para o analista copiar e enviar para o técnico. Indique o site, o equipamento e sugira o que o técnico deve testar primeiro no local - ex: medir tensão, limpar fibra, checar disjuntor).
-
-        2. ALTERAÇÃO DE ESCALA (AÇÃO NO BANCO DE DADOS): 
-        Se o usuário pedir para alterar o plantão de algum técnico (ex: "Muda o João para Férias", "Coloca o Marcos na escala 8"), responda confirmando a ação, MAS a ÚLTIMA linha da sua resposta deve ser OBRIGATORIAMENTE este código:
-        [UPDATE_DB|NOME_DO_TECNICO|NOVO_STATUS]
-        Exemplo: [UPDATE_DB|Joao|Férias]
-        """
-        
-        response = model.generate_content(prompt_sistema + "\n\nUsuário diz: " + mensagem_usuario)
-        texto_ia = response.text
-        
-        # Função secreta de alterar a escala
-        if "[UPDATE_DB|" in texto_ia:
-            linhas = texto_ia.split('\n')
-            comando = [l for l in linhas if "[UPDATE_DB|" in l][0]
-            texto_limpo = texto_ia.replace(comando, "").strip()
-            
-            partes = comando.replace("[", "").replace("]", "").split("|")
-            if len(partes) >= 3:
-                nome_tec = partes[1]
-                novo_status = partes[2]
-                resultado_db = atualizar_tecnico_dinamico(nome_tec, novo_status)
-                texto_limpo += f"<br><br><div style='background:var(--success); color:white; padding:10px; border-radius:8px;'><b>🤖 Ação da IA concluída:</b><br>{resultado_db}</div>"
-            
-            texto_html = texto_limpo.replace('\n', '<br>')
-            return jsonify({"texto": texto_html})
-
-        texto_html = texto_ia.replace('\n', '<br>')
-        return jsonify({"texto": texto_html})
-        
-    except Exception as e:
-        debug_info = f"<b>Falha de conexão com a IA.</b><br>Erro técnico: {str(e)}<br><br><b>Modelos liberados na sua chave do Google:</b><br>{', '.join(modelos_disponiveis) if 'modelos_disponiveis' in locals() else 'Nenhum modelo lido'}<br><br><i>A IA tentou usar o modelo: {modelo_escolhido if 'modelo_escolhido' in locals() else 'Desconhecido'}</i>"
-        return jsonify({"texto": debug_info})
+    if not ai.GEMINI_KEY: return jsonify({"texto": ai.MSG_SEM_CHAVE})
+    # "sem_cache": true força uma nova resposta do modelo (ex.: o analista quer outra análise).
+    return jsonify({"texto": ai.responder(dados.get("message"), usar_cache=not dados.get("sem_cache"))})
+
+@app.route("/chat_ia_stream", methods=["POST"])
+def chat_ia_stream():
+    dados = request.json
+    if not ai.GEMINI_KEY: eventos = iter([{"erro": ai.MSG_SEM_CHAVE}])
+    else: eventos = ai.responder_stream(dados.get("message"), usar_cache=not dados.get("sem_cache"))
+    sse = (f"data: {json.dumps(e, ensure_ascii=False)}\n\n" for e in eventos)
+    return Response(stream_with_context(sse), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.route("/autocomplete", methods=["GET"])
-def autocomplete(): return jsonify(get_autocomplete_data())
+def autocomplete():
+    indice = get_indice_busca()
+    if request.args.get("q") is not None:
+        limite = min(max(request.args.get("limit", 8, type=int), 1), 50)
+        return jsonify(indice.autocompletar(request.args["q"], limite))
+    # Lista completa: ETag = versão do índice; o navegador só baixa de novo depois de um upload.
+    gzip_aceito = "gzip" in request.headers.get("Accept-Encoding", "")
+    resp = Response(indice.json_completo(gzip_aceito), mimetype="application/json")
+    if gzip_aceito: resp.headers["Content-Encoding"] = "gzip"
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.set_etag(indice.versao + ("-gz" if gzip_aceito else ""))
+    return resp.make_conditional(request)
 
 @app.route("/tecnicos", methods=["GET"])
 def tecnicos(): return jsonify(get_all_tecnicos())
@@ -120,11 +135,33 @@ def online():
     if not session.get('logged_in'): return jsonify([]), 401
     return jsonify(get_online_users())
 
+@app.route("/admin/historico/fila", methods=["GET"])
+def fila_historico():
+    if not session.get('logged_in'): return jsonify({"erro": "Não autorizado"}), 401
+    return jsonify(history_writer.escritor.status())
+
+@app.route("/admin/cache/consultas", methods=["GET"])
+def cache_consultas():
+    if not session.get('logged_in'): return jsonify({"erro": "Não autorizado"}), 401
+    return jsonify({**query_cache.cache.status(), "listas": query_cache.listas.status(), "versoes": data_versions.status()})
+
+@app.route("/admin/estatisticas", methods=["GET"])
+def estatisticas():
+    if not session.get('logged_in'): return jsonify({"erro": "Não autorizado"}), 401
+    dias = min(max(request.args.get("dias", 7, type=int), 1), 366)
+    limite = min(max(request.args.get("limite", 10, type=int), 1), 100)
+    return jsonify(history_rollup.estatisticas(dias, limite))
+
 @app.route("/historico", methods=["GET"])
-def historico(): return jsonify(get_historico())
+def historico(): return resposta_condicional(TOPICO_HISTORICO)
 
 @app.route("/aviso", methods=["GET"])
-def fetch_aviso(): return jsonify({"aviso": get_aviso()})
+def fetch_aviso(): return resposta_condicional(TOPICO_AVISO)
+
+@app.route("/eventos", methods=["GET"])
+def eventos():
+    if not EVENTOS_SSE: return jsonify({"erro": "SSE desabilitado"}), 404
+    return Response(stream_with_context(events.stream(["historico", "aviso"])), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.route("/admin/aviso", methods=["POST"])
 def update_aviso():
@@ -133,7 +170,9 @@ def update_aviso():
     return jsonify({"sucesso": True})
 
 @app.route("/visao_geral", methods=["GET"])
-def visao_geral(): return jsonify(get_visao_geral())
+def visao_geral():
+    try: return jsonify(get_visao_geral(request.args.get("data")))
+    except DataInvalida as e: return jsonify({"erro": str(e)}), 400
 
 @app.route("/login", methods=["POST"])
 def login():
@@ -152,27 +191,34 @@ def listar_sugestoes():
     if not session.get('logged_in'): return jsonify({"erro": "Não autorizado"}), 401
     return jsonify(get_suggestions())
 
-@app.route("/upload_sites", methods=["POST"])
-def upload_sites():
+def enfileirar_upload(tipo, funcao):
     if not session.get('logged_in'): return jsonify({"erro": "Não autorizado"}), 401
     file = request.files.get("planilha")
-    if file:
-        filepath = os.path.join(UPLOAD_FOLDER, secure_filename(file.filename))
-        file.save(filepath)
-        try: process_excel_sites(filepath); return jsonify({"mensagem": "Sites atualizados!"}), 200
-        except Exception as e: return jsonify({"erro": f"Erro: {str(e)}"}), 500
-    return jsonify({"erro": "Nenhum arquivo"}), 400
+    if not file: return jsonify({"erro": "Nenhum arquivo"}), 400
+    # Nome único por upload: um job substituído nunca lê o arquivo do upload que o substituiu.
+    filepath = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4().hex}_{secure_filename(file.filename)}")
+    file.save(filepath)
+    try: job_id = jobs.enviar(tipo, funcao, filepath)
+    except Exception as e: return jsonify({"erro": f"Erro: {str(e)}"}), 500
+    return jsonify({"mensagem": "Planilha recebida, processando em segundo plano.", "job_id": job_id}), 202
+
+@app.route("/upload_sites", methods=["POST"])
+def upload_sites(): return enfileirar_upload("sites", process_excel_sites)
 
 @app.route("/upload_escala", methods=["POST"])
 def upload_escala():
+    # "mes": mês dos cabeçalhos que só trazem o dia (opcional se a planilha tiver datas).
+    try: mes_ano = mes_informado(request.form.get("mes"))
+    except ValueError: return jsonify({"erro": "Mês da escala inválido (use AAAA-MM)."}), 400
+    return enfileirar_upload("escala", functools.partial(process_excel_escala, mes_ano=mes_ano))
+
+@app.route("/admin/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
     if not session.get('logged_in'): return jsonify({"erro": "Não autorizado"}), 401
-    file = request.files.get("planilha")
-    if file:
-        filepath = os.path.join(UPLOAD_FOLDER, secure_filename(file.filename))
-        file.save(filepath)
-        try: process_excel_escala(filepath); return jsonify({"mensagem": "Escala atualizada!"}), 200
-        except Exception as e: return jsonify({"erro": f"Erro: {str(e)}"}), 500
-    return jsonify({"erro": "Nenhum arquivo"}), 400
+    job = jobs.status(job_id)
+    if not job: return jsonify({"erro": "Job não encontrado"}), 404
+    return jsonify(job)
 
 if __name__ == "__main__":
+    init_db()
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import logging
+import threading
+from functools import wraps
+from contextlib import contextmanager
+from collections import defaultdict
+
+# Métricas em memória no formato texto do Prometheus (GET /metrics), sem dependência extra.
+# Cada worker do gunicorn tem o seu registro; o label "worker" (pid) permite agregar no Prometheus.
+# Log de requisições lentas: METRICAS_LENTO_MS=500 registra em "spi.lento" o detalhamento por etapa.
+METRICAS_LENTO_MS = float(os.getenv("METRICAS_LENTO_MS", "0"))
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_QUERIES = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+log_lento = logging.getLogger("spi.lento")
+
+def _escapar(v):
+    return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _fmt_labels(nomes, valores, extra=None):
+    # Todas as séries levam o pid do worker para não se misturarem entre processos.
+    pares = [("worker", os.getpid())] + list(zip(nomes, valores)) + ([extra] if extra else [])
+    return "{" + ",".join(f'{n}="{_escapar(v)}"' for n, v in pares) + "}"
+
+class Contador:
+    def __init__(self, nome, ajuda, labels=()):
+        self.nome, self.ajuda, self.labels = nome, ajuda, tuple(labels)
+        self._valores = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, valor=1, **labels):
+        chave = tuple(labels.get(l, "") for l in self.labels)
+        with self._lock: self._valores[chave] += valor
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} counter"]
+        with self._lock: itens = list(self._valores.items())
+        for chave, v in itens: linhas.append(f"{self.nome}{_fmt_labels(self.labels, chave)} {v:g}")
+        return linhas
+
+class Histograma:
+    def __init__(self, nome, ajuda, labels=(), buckets=BUCKETS_SEGUNDOS):
+        self.nome, self.ajuda, self.labels, self.buckets = nome, ajuda, tuple(labels), tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **labels):
+        chave = tuple(labels.get(l, "") for l in self.labels)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None: serie = self._series[chave] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite: serie[0][i] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        with self._lock: itens = [(k, list(s[0]), s[1], s[2]) for k, s in self._series.items()]
+        for chave, contagens, soma, total in itens:
+            for limite, c in zip(self.buckets, contagens):
+                linhas.append(f"{self.nome}_bucket{_fmt_labels(self.labels, chave, ('le', f'{limite:g}'))} {c}")
+            linhas.append(f"{self.nome}_bucket{_fmt_labels(self.labels, chave, ('le', '+Inf'))} {total}")
+            linhas.append(f"{self.nome}_sum{_fmt_labels(self.labels, chave)} {soma:.6f}")
+            linhas.append(f"{self.nome}_count{_fmt_labels(self.labels, chave)} {total}")
+        return linhas
+
+REQUISICOES = Histograma("spi_requisicao_segundos", "Duração das requisições HTTP", ("rota", "metodo", "status"))
+ETAPAS = Histograma("spi_etapa_segundos", "Tempo gasto por etapa dentro de uma requisição", ("rota", "etapa"))
+QUERIES_POR_REQUISICAO = Histograma("spi_queries_por_requisicao", "Round-trips ao banco por requisição", ("rota",), BUCKETS_QUERIES)
+SQL = Histograma("spi_sql_segundos", "Duração de cada comando SQL (inclui threads de fundo)")
+QUERY_DATA = Histograma("spi_query_data_segundos", "Duração do query_data por ramo que casou", ("ramo",))
+RAMOS = Contador("spi_query_data_ramo_total", "Consultas do /chat por ramo que casou", ("ramo",))
+REGISTRO = [REQUISICOES, ETAPAS, QUERIES_POR_REQUISICAO, SQL, QUERY_DATA, RAMOS]
+# Funções extras que devolvem linhas prontas (ex.: estatísticas do cache de clima e do histórico).
+COLETORES = []
+
+_local = threading.local()
+
+def iniciar_requisicao(rota):
+    _local.req = {"rota": rota, "inicio": time.perf_counter(), "etapas": defaultdict(float), "queries": 0, "ramo": None}
+
+def finalizar_requisicao(metodo, status):
+    req = getattr(_local, 'req', None)
+    _local.req = None
+    if req is None: return
+    total = time.perf_counter() - req["inicio"]
+    REQUISICOES.observar(total, rota=req["rota"], metodo=metodo, status=status)
+    QUERIES_POR_REQUISICAO.observar(req["queries"], rota=req["rota"])
+    for nome, dur in req["etapas"].items(): ETAPAS.observar(dur, rota=req["rota"], etapa=nome)
+    if METRICAS_LENTO_MS and total * 1000 >= METRICAS_LENTO_MS:
+        detalhe = {"rota": req["rota"], "metodo": metodo, "status": status, "total_ms": round(total * 1000, 1), "queries": req["queries"], "ramo": req["ramo"],
+                   "etapas_ms": {n: round(d * 1000, 1) for n, d in sorted(req["etapas"].items(), key=lambda x: -x[1])}}
+        log_lento.warning("requisição lenta %s", json.dumps(detalhe, ensure_ascii=False))
+
+def _somar_etapa(nome, dur):
+    req = getattr(_local, 'req', None)
+    if req is not None: req["etapas"][nome] += dur
+
+@contextmanager
+def etapa(nome):
+    # As etapas podem se sobrepor a "db" (ex.: "indice" quando o índice é reconstruído).
+    inicio = time.perf_counter()
+    try: yield
+    finally: _somar_etapa(nome, time.perf_counter() - inicio)
+
+def medido(nome):
+    def decorador(fn):
+        @wraps(fn)
+        def envolvida(*args, **kwargs):
+            with etapa(nome): return fn(*args, **kwargs)
+        return envolvida
+    return decorador
+
+def registrar_query(dur):
+    SQL.observar(dur)
+    req = getattr(_local, 'req', None)
+    if req is not None:
+        req["queries"] += 1
+        req["etapas"]["db"] += dur
+
+def marcar_ramo(ramo):
+    RAMOS.inc(ramo=ramo)
+    _local.ramo = ramo
+    req = getattr(_local, 'req', None)
+    if req is not None: req["ramo"] = ramo
+
+@contextmanager
+def medir_query_data():
+    _local.ramo = None
+    inicio = time.perf_counter()
+    try: yield
+    finally: QUERY_DATA.observar(time.perf_counter() - inicio, ramo=getattr(_local, 'ramo', None) or "erro")
+
+def exportar():
+    linhas = []
+    for m in REGISTRO: linhas += m.exportar()
+    for coletor in COLETORES:
+        try: linhas += coletor()
+        except Exception: pass
+    return "\n".join(linhas) + "\n"
+
+def linhas_contadores(nome, ajuda, stats, label="tipo", tipo="counter"):
+    linhas = [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}"]
+    for k, v in stats.items(): linhas.append(f"{nome}{_fmt_labels((label,), (k,))} {v:g}")
+    return linhas
@@ -0,0 +1,164 @@
+import sys
+import json
+
+# Migrações versionadas, aplicadas em ordem pelo init_db e registradas em schema_version.
+# Cada uma traz as consultas quentes que deve atender ("planos"): (sql, params, índices aceitos).
+MIGRACOES = [
+    {
+        "versao": 1,
+        "descricao": "Índice de escala pela chave do diff de upload",
+        "comandos": [
+            "CREATE INDEX IF NOT EXISTS idx_escala_chave ON escala (mes_ano, ddd_aba, tecnico, dia_mes)",
+        ],
+        "planos": [
+            ("DELETE FROM escala WHERE mes_ano = ANY(%s) AND ddd_aba = %s AND tecnico = %s AND dia_mes = %s", (['05-2026'], 'DDD 19', 'JOAO', '5'), ['idx_escala_chave']),
+        ],
+    },
+    {
+        "versao": 2,
+        "descricao": "Índice trigram em escala.cm para as buscas cm ILIKE '%x%'",
+        "comandos": [
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            "CREATE INDEX IF NOT EXISTS idx_escala_cm_trgm ON escala USING gin (cm gin_trgm_ops)",
+        ],
+        "planos": [
+            ("SELECT * FROM escala WHERE cm ILIKE %s", ('%CPS%',), ['idx_escala_cm_trgm']),
+            ("SELECT * FROM escala WHERE cm ILIKE %s AND dia_mes = %s", ('%CPS%', '5'), ['idx_escala_cm_trgm']),
+        ],
+    },
+    {
+        "versao": 3,
+        "descricao": "Índices de historico por data e de sites por CM responsável",
+        "comandos": [
+            "CREATE INDEX IF NOT EXISTS idx_historico_data ON historico (data DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_sites_cm ON sites (cm_responsavel)",
+        ],
+        "planos": [
+            ("SELECT usuario, sigla, status, data FROM historico ORDER BY data DESC LIMIT 15", (), ['idx_historico_data']),
+            ("SELECT nome_da_localidade FROM sites WHERE cm_responsavel = %s AND nome_da_localidade != '' LIMIT 1", ('CPS',), ['idx_sites_cm']),
+        ],
+    },
+    {
+        "versao": 4,
+        "descricao": "Coluna tipada escala.data_plantao (DATE), mantida por trigger a partir de dia_mes/mes_ano",
+        "comandos": [
+            "ALTER TABLE escala ADD COLUMN IF NOT EXISTS data_plantao DATE",
+            """CREATE OR REPLACE FUNCTION escala_data_plantao() RETURNS trigger AS $$
+            DECLARE inicio DATE;
+            BEGIN
+                NEW.data_plantao := NULL;
+                IF NEW.dia_mes ~ '^[0-9]{1,2}$' AND NEW.mes_ano ~ '^(0[1-9]|1[0-2])-[0-9]{4}$' THEN
+                    inicio := to_date(NEW.mes_ano, 'MM-YYYY');
+                    IF NEW.dia_mes::int BETWEEN 1 AND EXTRACT(DAY FROM inicio + INTERVAL '1 month' - INTERVAL '1 day') THEN
+                        NEW.data_plantao := inicio + (NEW.dia_mes::int - 1);
+                    END IF;
+                END IF;
+                RETURN NEW;
+            END $$ LANGUAGE plpgsql""",
+            "DROP TRIGGER IF EXISTS trg_escala_data_plantao ON escala",
+            "CREATE TRIGGER trg_escala_data_plantao BEFORE INSERT OR UPDATE OF dia_mes, mes_ano ON escala FOR EACH ROW EXECUTE FUNCTION escala_data_plantao()",
+            "UPDATE escala SET dia_mes = dia_mes WHERE data_plantao IS NULL",
+            "CREATE INDEX IF NOT EXISTS idx_escala_data_cm_tecnico ON escala (data_plantao, cm, tecnico)",
+            "CREATE INDEX IF NOT EXISTS idx_escala_data_tecnico ON escala (data_plantao, tecnico)",
+        ],
+        "planos": [
+            ("SELECT * FROM escala WHERE cm = %s AND data_plantao = %s", ('CPS', '2026-05-05'), ['idx_escala_data_cm_tecnico']),
+            ("SELECT * FROM escala WHERE tecnico = %s AND data_plantao = %s", ('JOAO', '2026-05-05'), ['idx_escala_data_tecnico']),
+        ],
+    },
+    {
+        "versao": 5,
+        "descricao": "Escala em vários meses: consultas por data_plantao (dia_mes sozinho misturava meses)",
+        "comandos": [
+            "CREATE INDEX IF NOT EXISTS idx_escala_data_aba ON escala (data_plantao, ddd_aba)",
+        ],
+        "planos": [
+            ("SELECT * FROM escala WHERE ddd_aba IN %s AND data_plantao = %s", (('DDD 19 CAS',), '2026-05-05'), ['idx_escala_data_aba']),
+            ("SELECT * FROM escala WHERE cm ILIKE %s AND data_plantao = %s", ('%CPS%', '2026-05-05'), ['idx_escala_cm_trgm', 'idx_escala_data_cm_tecnico']),
+            ("SELECT * FROM escala WHERE data_plantao = %s AND tecnico != '' ORDER BY cm ASC, tecnico ASC", ('2026-05-05',), ['idx_escala_data_cm_tecnico']),
+        ],
+    },
+    {
+        "versao": 6,
+        "descricao": "Consolidação horária e arquivo do historico (retenção), com a base de cada consulta",
+        "comandos": [
+            "ALTER TABLE historico ADD COLUMN IF NOT EXISTS base TEXT DEFAULT ''",
+            "CREATE TABLE IF NOT EXISTS historico_horario (hora TIMESTAMP NOT NULL, sigla TEXT NOT NULL, base TEXT NOT NULL, status TEXT NOT NULL, usuario TEXT NOT NULL, total INTEGER NOT NULL, PRIMARY KEY (hora, sigla, base, status, usuario))",
+            "CREATE TABLE IF NOT EXISTS historico_arquivo (id INTEGER PRIMARY KEY, usuario TEXT, sigla TEXT, status TEXT, base TEXT, data TIMESTAMP)",
+            "CREATE TABLE IF NOT EXISTS historico_consolidado (id INTEGER PRIMARY KEY CHECK (id = 1), ate TIMESTAMP)",
+            "INSERT INTO historico_consolidado (id, ate) VALUES (1, NULL) ON CONFLICT DO NOTHING",
+        ],
+        "planos": [
+            ("SELECT sigla, SUM(total) FROM historico_horario WHERE hora >= %s GROUP BY sigla", ('2026-05-01',), ['historico_horario_pkey']),
+            ("SELECT id FROM historico WHERE data < %s ORDER BY data LIMIT 5000", ('2026-01-01',), ['idx_historico_data']),
+            ("SELECT usuario, sigla, status, base, data FROM historico WHERE data >= %s AND data < %s", ('2026-05-01 10:00', '2026-05-01 11:00'), ['idx_historico_data']),
+        ],
+    },
+    {
+        "versao": 7,
+        "descricao": "Versão de cada domínio de dados (sites, escala, aviso) para invalidar os caches de todos os workers",
+        "comandos": [
+            "CREATE TABLE IF NOT EXISTS versoes_dados (dominio TEXT PRIMARY KEY, versao BIGINT NOT NULL DEFAULT 0, atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP)",
+            "INSERT INTO versoes_dados (dominio) VALUES ('sites'), ('escala'), ('aviso') ON CONFLICT DO NOTHING",
+        ],
+        "planos": [],
+    },
+    {
+        "versao": 8,
+        "descricao": "Batimento dos jobs de upload, para marcar como erro os que morreram com o worker",
+        "comandos": [
+            "ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS batida TIMESTAMP",
+        ],
+        "planos": [],
+    },
+]
+
+def versao_atual(cursor):
+    cursor.execute("CREATE TABLE IF NOT EXISTS schema_version (versao INTEGER PRIMARY KEY, descricao TEXT, aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+    cursor.execute("SELECT COALESCE(MAX(versao), 0) FROM schema_version")
+    return cursor.fetchone()[0]
+
+def migrar(cursor):
+    # O advisory lock evita que dois workers subindo juntos apliquem a mesma migração.
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext('spi_migracoes'))")
+    atual = versao_atual(cursor)
+    aplicadas = []
+    for m in MIGRACOES:
+        if m["versao"] <= atual: continue
+        for comando in m["comandos"]: cursor.execute(comando)
+        cursor.execute("INSERT INTO schema_version (versao, descricao) VALUES (%s, %s)", (m["versao"], m["descricao"]))
+        aplicadas.append(m["versao"])
+    return aplicadas
+
+def _indices_do_plano(no):
+    encontrados = {no["Index Name"]} if "Index Name" in no else set()
+    for filho in no.get("Plans", []): encontrados |= _indices_do_plano(filho)
+    return encontrados
+
+def verificar_planos(cursor, versoes=None):
+    # Com enable_seqscan desligado o planner só cai em Seq Scan se nenhum índice servir à consulta,
+    # o que torna o teste independente do tamanho das tabelas no ambiente.
+    cursor.execute("SET LOCAL enable_seqscan = off")
+    resultado = []
+    for m in MIGRACOES:
+        if versoes and m["versao"] not in versoes: continue
+        for sql, params, esperados in m["planos"]:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + cursor.mogrify(sql, params).decode())
+            plano = cursor.fetchone()[0]
+            if isinstance(plano, str): plano = json.loads(plano)
+            usados = _indices_do_plano(plano[0]["Plan"])
+            resultado.append({"versao": m["versao"], "sql": sql, "esperados": esperados, "usados": sorted(usados), "ok": bool(usados & set(esperados))})
+    return resultado
+
+if __name__ == "__main__":
+    # python migrations.py              -> aplica as migrações pendentes
+    # python migrations.py --verificar  -> confere os planos das consultas quentes (sai com 1 se algum falhar)
+    from db_pool import conexao
+    with conexao() as conn:
+        cursor = conn.cursor()
+        if "--verificar" in sys.argv:
+            relatorio = verificar_planos(cursor)
+            for r in relatorio: print(f"[{'OK' if r['ok'] else 'FALHOU'}] v{r['versao']} {r['sql']} -> {', '.join(r['usados']) or 'Seq Scan'}")
+            conn.rollback()
+            sys.exit(0 if all(r["ok"] for r in relatorio) else 1)
+        print(f"Migrações aplicadas: {migrar(cursor) or 'nenhuma (schema em dia)'}")
@@ -0,0 +1,78 @@
+import os
+import time
+import atexit
+import threading
+from psycopg2.extras import execute_values
+from db_pool import conexao
+
+# Os pings ficam em memória e vão para usuarios_online num único upsert a cada PRESENCA_FLUSH segundos.
+PRESENCA_FLUSH = float(os.getenv("PRESENCA_FLUSH", "30"))
+PRESENCA_JANELA = 120
+
+class RastreadorPresenca:
+    def __init__(self, intervalo=PRESENCA_FLUSH, janela=PRESENCA_JANELA):
+        self.intervalo, self.janela = intervalo, janela
+        self._vistos = {}
+        self._pendentes = set()
+        self._outros, self._outros_lido_em = set(), 0.0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _garantir_thread(self):
+        if self._thread is not None and self._pid == os.getpid(): return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid(): return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name="presenca-flush", daemon=True)
+            self._thread.start()
+
+    def ping(self, nome):
+        with self._lock:
+            self._vistos[nome] = time.time()
+            self._pendentes.add(nome)
+        self._garantir_thread()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.intervalo)
+            try: self.flush()
+            except Exception: pass
+
+    def flush(self):
+        agora = time.time()
+        with self._lock:
+            lote = [(n, agora - self._vistos[n]) for n in self._pendentes]
+            self._pendentes = set()
+            for n in [n for n, t in self._vistos.items() if agora - t > self.janela]: del self._vistos[n]
+        if not lote: return 0
+        try:
+            with conexao() as conn:
+                cursor = conn.cursor()
+                execute_values(cursor, "INSERT INTO usuarios_online (nome, ultima_atividade) VALUES %s ON CONFLICT (nome) DO UPDATE SET ultima_atividade = GREATEST(usuarios_online.ultima_atividade, EXCLUDED.ultima_atividade)", lote, template="(%s, CURRENT_TIMESTAMP - %s * INTERVAL '1 second')")
+        except Exception:
+            with self._lock: self._pendentes.update(n for n, _ in lote if n in self._vistos)
+            raise
+        return len(lote)
+
+    def _online_outros_workers(self):
+        # Pings recebidos por outros workers só chegam aqui via banco, relido no máximo a cada intervalo.
+        if time.monotonic() - self._outros_lido_em >= self.intervalo:
+            with conexao() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT nome FROM usuarios_online WHERE ultima_atividade >= NOW() - INTERVAL '2 minutes'")
+                self._outros = {r[0] for r in cursor.fetchall()}
+            self._outros_lido_em = time.monotonic()
+        return self._outros
+
+    def online(self):
+        limite = time.time() - self.janela
+        with self._lock: locais = {n for n, t in self._vistos.items() if t >= limite}
+        return sorted(locais | self._online_outros_workers())
+
+rastreador = RastreadorPresenca()
+
+@atexit.register
+def _flush_final():
+    try: rastreador.flush()
+    except Exception: pass
@@ -0,0 +1,85 @@
+import os
+import time
+import threading
+from collections import OrderedDict, defaultdict
+
+# Cache das respostas completas do query_data, por (termo normalizado, dia, mês).
+# Cada entrada guarda as "tags" dos dados de que depende; quem altera esses dados invalida só as tags
+# afetadas (ver database.py). O TTL é a rede de segurança para alterações feitas por outros workers.
+CONSULTA_CACHE_MAX = int(os.getenv("CONSULTA_CACHE_MAX", "2000"))
+CONSULTA_CACHE_TTL = float(os.getenv("CONSULTA_CACHE_TTL", "60"))
+
+class CacheConsultas:
+    def __init__(self, max_itens=CONSULTA_CACHE_MAX, ttl=CONSULTA_CACHE_TTL):
+        self.max_itens, self.ttl = max_itens, ttl
+        self._itens = OrderedDict()
+        self._por_tag = defaultdict(set)
+        self._geracao = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expirados": 0, "invalidados": 0, "despejados": 0}
+
+    def _remover(self, chave):
+        _, _, tags = self._itens.pop(chave)
+        for tag in tags:
+            chaves = self._por_tag.get(tag)
+            if chaves is None: continue
+            chaves.discard(chave)
+            if not chaves: del self._por_tag[tag]
+
+    def obter(self, chave):
+        # Devolve (valor ou None, geração); a geração volta no guardar para descartar um valor
+        # calculado enquanto alguma invalidação acontecia.
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.stats["misses"] += 1
+                return None, self._geracao
+            if time.monotonic() >= item[1]:
+                self._remover(chave)
+                self.stats["expirados"] += 1
+                self.stats["misses"] += 1
+                return None, self._geracao
+            self._itens.move_to_end(chave)
+            self.stats["hits"] += 1
+            return item[0], self._geracao
+
+    def guardar(self, chave, valor, tags, geracao):
+        if self.max_itens <= 0 or self.ttl <= 0: return
+        with self._lock:
+            if geracao != self._geracao: return
+            if chave in self._itens: self._remover(chave)
+            self._itens[chave] = (valor, time.monotonic() + self.ttl, frozenset(tags))
+            for tag in tags: self._por_tag[tag].add(chave)
+            while len(self._itens) > self.max_itens:
+                self._remover(next(iter(self._itens)))
+                self.stats["despejados"] += 1
+
+    def invalidar(self, *tags):
+        with self._lock:
+            self._geracao += 1
+            chaves = set()
+            for tag in tags: chaves |= self._por_tag.get(tag, set())
+            for chave in chaves: self._remover(chave)
+            self.stats["invalidados"] += len(chaves)
+        return len(chaves)
+
+    def limpar(self):
+        with self._lock:
+            self._geracao += 1
+            self.stats["invalidados"] += len(self._itens)
+            self._itens.clear()
+            self._por_tag.clear()
+
+    def status(self):
+        return dict(self.stats, itens=len(self._itens))
+
+cache = CacheConsultas()
+# Listas inteiras (visão geral por data, técnicos), com as mesmas tags; invalidadas junto com o cache.
+listas = CacheConsultas(max_itens=int(os.getenv("LISTAS_CACHE_MAX", "64")))
+
+def invalidar(*tags):
+    return cache.invalidar(*tags) + listas.invalidar(*tags)
+
+def limpar():
+    cache.limpar()
+    listas.limpar()
@@ -0,0 +1,144 @@
+import os
+import re
+import gzip
+import json
+import heapq
+import bisect
+import hashlib
+import threading
+import time
+import unicodedata
+from rapidfuzz import process as rf_process, fuzz
+
+# Índice em memória para siglas, cidades, bases e técnicos.
+# É reconstruído após cada upload de sites/escala (ver invalidar) e, como rede de
+# segurança entre workers do gunicorn, depois de INDICE_BUSCA_TTL segundos.
+INDICE_BUSCA_TTL = int(os.getenv("INDICE_BUSCA_TTL", "300"))
+LIMITE_PREFIXO = 50
+
+def normalizar(texto):
+    if not texto: return ""
+    sem_acento = "".join(c for c in unicodedata.normalize("NFKD", str(texto)) if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^0-9A-Z]+", " ", sem_acento.upper()).split())
+
+class Colecao:
+    def __init__(self, valores):
+        self.originais = {}
+        for v in valores:
+            chave = normalizar(v)
+            if chave and chave not in self.originais: self.originais[chave] = v
+        self.chaves = sorted(self.originais)
+
+    def __len__(self):
+        return len(self.chaves)
+
+    def prefixados(self, chave, limite=LIMITE_PREFIXO):
+        i = bisect.bisect_left(self.chaves, chave)
+        encontrados = []
+        while i < len(self.chaves) and self.chaves[i].startswith(chave) and len(encontrados) < limite:
+            encontrados.append(self.chaves[i]); i += 1
+        return encontrados
+
+    def melhor(self, termo, corte):
+        # Mesmo contrato de thefuzz.process.extractOne (valor original, score inteiro),
+        # mas devolve None quando nada atinge o corte: exato -> prefixo -> fuzzy em lote.
+        chave = normalizar(termo)
+        if not chave or not self.chaves: return None
+        if chave in self.originais: return (self.originais[chave], 100)
+        for candidatos in (self.prefixados(chave), self.chaves):
+            if not candidatos: continue
+            # O thefuzz arredondava o score antes do corte: 85.5 passava num corte de 86. O rapidfuzz
+            # compara o float cru, então o corte desce 0.5 e a decisão final é sobre o score arredondado.
+            r = rf_process.extractOne(chave, candidatos, scorer=fuzz.WRatio, processor=None, score_cutoff=corte - 0.5)
+            if r and int(round(r[1])) >= corte: return (self.originais[r[0]], int(round(r[1])))
+        return None
+
+class IndiceBusca:
+    def __init__(self, sites, tecnicos, bases, abas):
+        self.sites_por_sigla = {}
+        self.sites_por_cidade = {}
+        for s in sites:
+            self.sites_por_sigla.setdefault(s['sigla'], s)
+            if s['nome_da_localidade']: self.sites_por_cidade.setdefault(s['nome_da_localidade'], s)
+        self.siglas = Colecao(self.sites_por_sigla)
+        self.cidades = Colecao(self.sites_por_cidade)
+        self.tecnicos = Colecao(tecnicos)
+        self.bases = Colecao(bases)
+        self.abas = sorted(set(a for a in abas if a))
+        self._montar_sugestoes(sites, bases, tecnicos)
+        self.criado_em = time.monotonic()
+
+    def _montar_sugestoes(self, sites, bases, tecnicos):
+        # Mesma lista (e ordem) que o /autocomplete sempre devolveu, mais índices de prefixo e trigramas.
+        self.sugestoes = []
+        for s in sites:
+            self.sugestoes.append({"termo": s['sigla'], "detalhe": s['nome_da_localidade'], "tipo": "📍 Site"})
+            if s['nome_da_localidade']: self.sugestoes.append({"termo": s['nome_da_localidade'], "detalhe": s['sigla'], "tipo": "🏙️ Cidade"})
+        for b in bases:
+            if b: self.sugestoes.append({"termo": b, "detalhe": "Região Inteira", "tipo": "🗺️ Base"})
+        for t in tecnicos:
+            if t: self.sugestoes.append({"termo": t, "detalhe": "Plantonista", "tipo": "👨‍🔧 Técnico"})
+        self._termos = [normalizar(s["termo"]) for s in self.sugestoes]
+        self._textos = [f"{t} {normalizar(s['detalhe'])}" for t, s in zip(self._termos, self.sugestoes)]
+        self._prefixos = sorted((palavra, i) for i, t in enumerate(self._termos) for palavra in {t} | set(t.split()))
+        self._trigramas = {}
+        for i, texto in enumerate(self._textos):
+            for tri in {texto[j:j + 3] for j in range(len(texto) - 2)}: self._trigramas.setdefault(tri, []).append(i)
+        corpo = json.dumps(self.sugestoes, ensure_ascii=False).encode()
+        self.versao = hashlib.sha1(corpo).hexdigest()[:16]
+        self._json, self._json_gzip = corpo, None
+
+    def json_completo(self, gzip_aceito=False):
+        if not gzip_aceito: return self._json
+        if self._json_gzip is None: self._json_gzip = gzip.compress(self._json, compresslevel=6)
+        return self._json_gzip
+
+    def autocompletar(self, q, limite=8):
+        chave = normalizar(q)
+        if not chave: return []
+        candidatos = set()
+        i = bisect.bisect_left(self._prefixos, (chave, -1))
+        while i < len(self._prefixos) and self._prefixos[i][0].startswith(chave):
+            candidatos.add(self._prefixos[i][1]); i += 1
+        if len(chave) >= 3:
+            listas = sorted((self._trigramas.get(chave[j:j + 3], []) for j in range(len(chave) - 2)), key=len)
+            if listas and listas[0]:
+                comuns = set(listas[0]).intersection(*listas[1:])
+                candidatos.update(c for c in comuns if chave in self._textos[c])
+
+        def rank(c):
+            termo = self._termos[c]
+            if termo == chave: classe = 0
+            elif termo.startswith(chave): classe = 1
+            elif any(p.startswith(chave) for p in termo.split()): classe = 2
+            elif chave in termo: classe = 3
+            else: classe = 4
+            return (classe, len(termo), termo, c)
+        return [self.sugestoes[c] for c in heapq.nsmallest(limite, candidatos, key=rank)]
+
+    def nomes_escala(self):
+        # O que da escala influencia qual ramo do query_data casa com um termo.
+        return (self.tecnicos.chaves, self.bases.chaves, self.abas)
+
+    def abas_contendo(self, termo):
+        termo = termo.upper()
+        return [a for a in self.abas if termo in a.upper()]
+
+_indice = None
+_lock = threading.Lock()
+
+def obter(carregador):
+    global _indice
+    indice = _indice
+    if indice is not None and time.monotonic() - indice.criado_em < INDICE_BUSCA_TTL: return indice
+    with _lock:
+        if _indice is None or time.monotonic() - _indice.criado_em >= INDICE_BUSCA_TTL:
+            _indice = IndiceBusca(**carregador())
+        return _indice
+
+def atual():
+    return _indice
+
+def invalidar():
+    global _indice
+    with _lock: _indice = None
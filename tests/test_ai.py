@@ -0,0 +1,83 @@
+import ai
+
+class Pedaco:
+    def __init__(self, texto): self.text = texto
+
+class ModeloFalso:
+    # Devolve a resposta inteira ou, com stream=True, nos pedaços dados (cortados onde o teste quiser).
+    def __init__(self, *pedacos):
+        self.pedacos, self.chamadas = pedacos, 0
+    def generate_content(self, prompt, stream=False):
+        self.chamadas += 1
+        return [Pedaco(p) for p in self.pedacos] if stream else Pedaco("".join(self.pedacos))
+
+class ResolvedorFalso:
+    modelos_disponiveis, modelo_escolhido = [], "falso"
+    def __init__(self, modelo): self.modelo = modelo
+    def obter(self): return self.modelo
+    def invalidar(self): pass
+
+def textos(eventos):
+    return [e["texto"] for e in eventos if "texto" in e]
+
+def test_timestamps_e_sequencia_nao_mudam_a_chave():
+    a = "2026-10-17 10:22:31 LOS alarm NE=OLT-CPS-01 seq=88213 csn: 77 AlarmSN=5"
+    b = "2026-10-18T11:00:02Z los ALARM  NE=OLT-CPS-01 seq=99999 csn: 12 AlarmSN=6"
+    assert ai.chave_cache(a) == ai.chave_cache(b)
+    assert ai.chave_cache("17/10/2026 10:22:31 BGP down peer 10.0.0.1") == ai.chave_cache("18/10/2026 23:59:59 BGP down peer 10.0.0.1")
+
+def test_porta_com_barras_fica_na_chave():
+    assert ai.chave_cache("LOS on port 1/1/10") != ai.chave_cache("LOS on port 1/1/12")
+
+def test_porta_com_dois_pontos_fica_na_chave():
+    assert ai.chave_cache("LOS Gi0/0/1:10") != ai.chave_cache("LOS Gi0/0/1:12")
+
+def test_serial_da_placa_fica_na_chave():
+    assert ai.chave_cache("Board SN 2102311 fault") != ai.chave_cache("Board SN 9999999 fault")
+    assert ai.chave_cache("serial no: 2102311") != ai.chave_cache("serial no: 9999999")
+
+def test_ids_longos_ficam_na_chave():
+    assert ai.chave_cache("ifIndex 1073741825 down") != ai.chave_cache("ifIndex 1073741826 down")
+
+def test_stream_segura_o_comando_mesmo_cortado_entre_pedacos(monkeypatch):
+    chamadas = []
+    monkeypatch.setattr(ai, "atualizar_tecnico_dinamico", lambda nome, status: chamadas.append((nome, status)) or "feito")
+    modelo = ModeloFalso("Confirmado, vou alterar.\n[UPD", "ATE_DB|Jo", "ao|Férias]")
+    eventos = list(ai.responder_stream("muda o joao para ferias", ResolvedorFalso(modelo), ai.CacheConsultas(10, 60)))
+    assert "".join(textos(eventos)) == "Confirmado, vou alterar.<br>"
+    assert not any("[" in t for t in textos(eventos))
+    assert eventos[-1]["fim"] and "feito" in eventos[-1]["acao"]
+    assert chamadas == [("Joao", "Férias")]
+
+def test_stream_libera_colchete_que_nao_e_comando():
+    modelo = ModeloFalso("Veja [nota", "] abaixo\nfim")
+    eventos = list(ai.responder_stream("oi", ResolvedorFalso(modelo), ai.CacheConsultas(10, 60)))
+    assert "".join(textos(eventos)) == "Veja [nota] abaixo<br>fim"
+    assert eventos[-1] == {"fim": True, "acao": ""}
+
+ALARME_A = "2026-10-17 10:22:31 LOS alarm NE=OLT-CPS-01 seq=88213"
+ALARME_B = "2026-10-18 11:00:02 LOS alarm NE=OLT-CPS-01 seq=99999"
+
+def test_alarme_repetido_vem_do_cache():
+    modelo, cache = ModeloFalso("linha 1\nlinha 2"), ai.CacheConsultas(10, 60)
+    assert ai.responder(ALARME_A, ResolvedorFalso(modelo), cache) == "linha 1<br>linha 2"
+    assert ai.responder(ALARME_B, ResolvedorFalso(modelo), cache) == "linha 1<br>linha 2"
+    assert textos(ai.responder_stream(ALARME_B, ResolvedorFalso(modelo), cache)) == ["linha 1<br>linha 2"]
+    assert modelo.chamadas == 1
+
+def test_usar_cache_false_sempre_chama_o_modelo():
+    modelo, cache = ModeloFalso("ok"), ai.CacheConsultas(10, 60)
+    ai.responder(ALARME_A, ResolvedorFalso(modelo), cache)
+    ai.responder(ALARME_A, ResolvedorFalso(modelo), cache, usar_cache=False)
+    list(ai.responder_stream(ALARME_A, ResolvedorFalso(modelo), cache, usar_cache=False))
+    assert modelo.chamadas == 3
+
+def test_resposta_com_comando_nao_vai_para_o_cache(monkeypatch):
+    chamadas = []
+    monkeypatch.setattr(ai, "atualizar_tecnico_dinamico", lambda nome, status: chamadas.append(nome) or "feito")
+    modelo, cache = ModeloFalso("ok\n[UPDATE_DB|Joao|Férias]"), ai.CacheConsultas(10, 60)
+    ai.responder("muda o joao", ResolvedorFalso(modelo), cache)
+    ai.responder("muda o joao", ResolvedorFalso(modelo), cache)
+    list(ai.responder_stream("muda o joao", ResolvedorFalso(modelo), cache))
+    assert modelo.chamadas == 3
+    assert chamadas == ["Joao"] * 3
@@ -0,0 +1,71 @@
+import threading
+from datetime import date
+import pytest
+import db_pool
+import database
+import query_cache
+import search_index
+import weather
+
+SITE = {'sigla': 'CPS', 'nome_da_localidade': 'CAMPINAS', 'ddd': '19', 'cm_responsavel': 'CPS'}
+PLANTAO = {'tecnico': 'JOAO', 'contato_corp': '19999', 'supervisor': 'ANA', 'cm': 'CPS', 'segmento': 'TX', 'horario': '8'}
+
+class CursorFalso:
+    def execute(self, sql, params=None): self.sql = sql
+    def fetchall(self): return [dict(PLANTAO)] if self.sql == database.SQL_ESCALA_SITE else []
+
+class ConexaoFalsa:
+    def cursor(self, cursor_factory=None): return CursorFalso()
+
+@pytest.fixture
+def consulta(monkeypatch):
+    # query_data sem banco: o conexao() reaproveita a conexão da thread, aqui uma falsa.
+    indice = search_index.IndiceBusca(sites=[SITE], tecnicos=['JOAO'], bases=[], abas=[])
+    monkeypatch.setattr(database, "get_indice_busca", lambda: indice)
+    monkeypatch.setattr(database, "save_historico", lambda *a: None)
+    monkeypatch.setattr(query_cache, "cache", query_cache.CacheConsultas(10, 60))
+    monkeypatch.setattr(db_pool._local, "conn", ConexaoFalsa(), raising=False)
+    yield lambda: database.query_data("CPS", "5/5/2026")
+    db_pool._local.conn = None
+
+def usar_clima(monkeypatch, buscar, espera_miss):
+    cache = weather.CacheClima(buscar=buscar, ttl=60, ttl_falha=60, max_stale=3600, max_itens=10, espera_miss=espera_miss)
+    monkeypatch.setattr(weather, "cache_clima", cache)
+    return cache
+
+def falhar(cidade): raise OSError("OpenWeather fora")
+
+def test_cidade_em_cache_negativo_nao_impede_o_cache_da_resposta(monkeypatch, consulta):
+    usar_clima(monkeypatch, falhar, espera_miss=1)
+    resposta = consulta()
+    assert resposta["encontrado"] and "Clima" not in resposta["cabecalho"]
+    assert consulta() == resposta
+    assert query_cache.cache.stats["hits"] == 1
+
+def test_resposta_com_clima_ainda_em_voo_nao_vai_para_o_cache(monkeypatch, consulta):
+    liberar = threading.Event()
+    usar_clima(monkeypatch, lambda cidade: liberar.wait(2) and "<br>☁️ <b>Clima Agora:</b> 25°C - Sol", espera_miss=0)
+    try:
+        consulta()
+        assert query_cache.cache.status()["itens"] == 0
+    finally: liberar.set()
+
+def test_clima_pronto_entra_na_resposta_cacheada(monkeypatch, consulta):
+    usar_clima(monkeypatch, lambda cidade: "<br>☁️ <b>Clima Agora:</b> 25°C - Sol", espera_miss=1)
+    assert "25°C" in consulta()["cabecalho"]
+    assert "25°C" in consulta()["cabecalho"]
+    assert query_cache.cache.stats["hits"] == 1
+
+def test_inicio_do_mes_recua_pela_virada_do_ano(monkeypatch):
+    class Relogio(database.datetime):
+        @classmethod
+        def now(cls, tz=None): return cls(2027, 1, 1, 2, 0)
+    monkeypatch.setattr(database, "datetime", Relogio)
+    # 02:00 UTC de 1/1 ainda é dezembro em Brasília.
+    assert database._inicio_do_mes() == date(2026, 12, 1)
+    assert database._inicio_do_mes(3) == date(2026, 9, 1)
+
+def test_data_invalida_nao_vira_hoje():
+    assert database._data_alvo("5/5/2026") == date(2026, 5, 5)
+    for invalida in ("31/2", "abc", "5/13", "0/5"):
+        with pytest.raises(database.DataInvalida): database._data_alvo(invalida)
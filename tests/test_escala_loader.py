@@ -0,0 +1,113 @@
+import pytest
+import escala_loader
+
+def ler(cabecalho, mes_ano, linhas=(('JOAO', '8', '12'),)):
+    df = escala_loader.normalizar_aba('DDD 19', list(cabecalho), iter(linhas), mes_ano)
+    return sorted(zip(df['dia_mes'], df['mes_ano']))
+
+def test_mes_informado():
+    assert escala_loader.mes_informado('2026-06') == '06-2026'
+    assert escala_loader.mes_informado('6/2026') == '06-2026'
+    assert escala_loader.mes_informado('') is None
+    for invalido in ('2026-13', 'junho', '06/26'):
+        with pytest.raises(ValueError): escala_loader.mes_informado(invalido)
+
+def test_dia_solto_usa_o_mes_do_upload():
+    assert ler(['FUNCIONÁRIOS', '3', '15'], '06-2026') == [('15', '06-2026'), ('3', '06-2026')]
+
+def test_dia_solto_usa_o_mes_das_colunas_datadas():
+    assert ler(['FUNCIONÁRIOS', '3/6/2026', '15'], None) == [('15', '06-2026'), ('3', '06-2026')]
+
+def test_dia_solto_sem_mes_e_recusado():
+    with pytest.raises(ValueError, match="Informe o mês"): ler(['FUNCIONÁRIOS', '3', '15'], None)
+
+def test_cabecalho_com_dois_meses_e_recusado():
+    with pytest.raises(ValueError, match="mais de um mês"): ler(['FUNCIONÁRIOS', '30/5/2026', '1/6/2026'], None)
+    with pytest.raises(ValueError, match="mais de um mês"): ler(['FUNCIONÁRIOS', '3/6/2026', '15'], '05-2026')
+
+def _planilha(path):
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'DDD 19 cas'
+    ws.append(['ESCALA DE PLANTÃO'])
+    ws.append(['FUNCIONÁRIOS', 'CONTATO CORP', 'SUPERVISOR', 'CM', 'SEGMENTO', 1, 2, '3', '1/5'])
+    ws.append(['JOAO', 19999990000.0, 'ANA', 'cps ', 'INFRA', 8.0, 8, 'a', 'B'])
+    ws.append([None, 19999990001, 'ANA', 'CPS', 'TX', 1, 1, 1, 1])
+    ws.append(['FUNCIONÁRIOS', None, None, None, None, 1, 1, 1, 1])
+    ws.append(['MARIA', '19 3333-0000', None, 'CPS', 'TX', 'f', None, 'FE', 12.0])
+    ws.append(['JOAO', 19999990000.0, 'ANA', 'CPS', 'INFRA', 5, 5, 5, 5])
+    sem_segmento = wb.create_sheet('DDD 11')
+    sem_segmento.append(['FUNCIONÁRIOS', 'CONTATO', 'CM', 1, 2])
+    sem_segmento.append(['PEDRO', 11988887777, 'SPO', 'X', 'c'])
+    wb.create_sheet('LEGENDA').append(['FUNCIONÁRIOS', 1])
+    wb.save(path)
+
+def _loop_antigo(file_path, mes_ano):
+    # O process_excel_escala de antes do melt (pd.ExcelFile + iterrows), só a parte da leitura.
+    import pandas as pd
+    from datetime import datetime
+    xl = pd.ExcelFile(file_path, engine='openpyxl')
+    chaves_vistas, all_rows = set(), []
+    for aba in xl.sheet_names:
+        if aba.strip().upper() in ['LEGENDA', 'INSTRUÇÕES', 'RESUMO', 'MENU']: continue
+        df = xl.parse(aba, dtype=str).fillna('')
+        header_row, df_dados = [], df
+        if any('FUNCION' in str(c).strip().upper() for c in df.columns): header_row = df.columns
+        else:
+            for i, row in df.iterrows():
+                if any('FUNCION' in str(v).strip().upper() for v in row.values):
+                    header_row, df_dados = row.values, df.iloc[i + 1:]
+                    break
+        if len(header_row) == 0: continue
+        tec_idx, contato_idx, sup_idx, cm_idx, seg_idx = -1, -1, -1, -1, -1
+        dias_idx_map = {}
+        for i, val in enumerate(header_row):
+            v_str = str(val).strip().upper()
+            if 'FUNCION' in v_str: tec_idx = i
+            elif 'CONTATO' in v_str: contato_idx = i
+            elif 'SUPERV' in v_str: sup_idx = i
+            elif v_str in ['CM', 'BASE', 'AREA', 'ÁREA'] or v_str == 'CM_RESPONSAVEL': cm_idx = i
+            elif 'SEGMENTO' in v_str: seg_idx = i
+            else:
+                dia_limpo = None
+                if isinstance(val, (datetime, pd.Timestamp)): dia_limpo = str(val.day)
+                else:
+                    poss_dia = v_str.split('/')[0].split('.')[0].strip()
+                    if poss_dia.isdigit() and 1 <= int(poss_dia) <= 31: dia_limpo = str(int(poss_dia))
+                if dia_limpo: dias_idx_map[i] = dia_limpo
+        for _, row in df_dados.iterrows():
+            row_vals = row.values
+            if tec_idx == -1 or len(row_vals) <= tec_idx: continue
+            tec = str(row_vals[tec_idx]).strip()
+            if not tec or tec.upper() in ['NAN', 'NONE', '', 'FUNCIONÁRIOS', 'FUNCIONARIOS']: continue
+            contato = str(row_vals[contato_idx]).replace('.0', '').replace('nan', '').strip() if contato_idx != -1 else ''
+            supervisor = str(row_vals[sup_idx]).replace('nan', '').strip() if sup_idx != -1 else ''
+            cm = str(row_vals[cm_idx]).replace('nan', '').strip().upper() if cm_idx != -1 else ''
+            segmento = str(row_vals[seg_idx]).replace('nan', '').strip() if seg_idx != -1 else 'Não especificado'
+            for d_idx, d_limpo in dias_idx_map.items():
+                plantao_val = str(row_vals[d_idx]).strip().upper()
+                if plantao_val and plantao_val not in ['F', 'NAN', 'NONE', 'NULL', '', 'C', 'L', 'FE', 'FF']:
+                    chave_unica = f"{aba}_{tec}_{d_limpo}_{mes_ano}"
+                    if chave_unica not in chaves_vistas:
+                        chaves_vistas.add(chave_unica)
+                        all_rows.append((str(aba).upper(), tec, contato, supervisor, cm, segmento, d_limpo, mes_ano, plantao_val))
+    return all_rows
+
+def test_melt_reproduz_o_loop_antigo(tmp_path):
+    path = str(tmp_path / 'escala.xlsx')
+    _planilha(path)
+    novo = [tuple(r) for r in escala_loader.ler_escala(path, '05-2026')[escala_loader.COLUNAS].itertuples(index=False)]
+    assert novo == _loop_antigo(path, '05-2026')
+    # O que a planilha exercita: dedupe (2ª linha do JOAO e a coluna '1/5' repetindo o dia 1), 8.0 -> '8',
+    # '.0' fora do contato, segmento padrão, técnico em branco e linha de cabeçalho repetida ignorados.
+    joao = [r for r in novo if r[1] == 'JOAO']
+    assert [(r[6], r[8]) for r in joao] == [('1', '8'), ('2', '8'), ('3', 'A')]
+    assert {r[2] for r in joao} == {'19999990000'}
+    assert [r[5] for r in novo if r[1] == 'PEDRO'] == ['Não especificado']
+    assert {r[1] for r in novo} == {'JOAO', 'MARIA', 'PEDRO'}
+
+def test_horario_em_texto_com_ponto_zero_tambem_vira_inteiro():
+    # Única diferença proposital para o loop antigo: lá o texto '12.0' ficava como veio e não casava na legenda.
+    df = escala_loader.normalizar_aba('DDD 19', ['FUNCIONÁRIOS', 1], iter([('JOAO', ' 12.0 ')]), '05-2026')
+    assert df['horario'].tolist() == ['12']
@@ -0,0 +1,47 @@
+import os
+import re
+import pytest
+import db_pool
+import database
+import migrations
+
+# Os planos só podem ser conferidos num Postgres de verdade (pg_trgm, EXPLAIN). Ex.:
+#   TEST_DATABASE_URL=postgresql://localhost/spi_teste python -m pytest tests/test_migrations.py
+# Tudo roda numa transação num schema próprio, desfeita no fim.
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+def test_versoes_em_ordem():
+    versoes = [m["versao"] for m in migrations.MIGRACOES]
+    assert versoes == list(range(1, len(versoes) + 1))
+
+def test_planos_so_citam_indices_criados():
+    criados = {"historico_horario_pkey"}
+    for m in migrations.MIGRACOES:
+        for comando in m["comandos"]:
+            criados |= set(re.findall(r'CREATE INDEX IF NOT EXISTS (\w+)', comando))
+            criados -= set(re.findall(r'DROP INDEX IF EXISTS (\w+)', comando))
+    for m in migrations.MIGRACOES:
+        for sql, _, esperados in m["planos"]:
+            assert set(esperados) <= criados, (m["versao"], sql)
+
+@pytest.fixture
+def cursor_teste():
+    if not TEST_DATABASE_URL: pytest.skip("defina TEST_DATABASE_URL para conferir os planos num Postgres")
+    import psycopg2
+    conn = psycopg2.connect(TEST_DATABASE_URL)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("CREATE SCHEMA spi_teste_migracoes")
+        cursor.execute("SET LOCAL search_path = spi_teste_migracoes, public")
+        # conexao() reaproveita a conexão da thread: o init_db roda nesta transação e não faz commit.
+        db_pool._local.conn, db_pool._local.apos_commit = conn, []
+        yield cursor
+    finally:
+        db_pool._local.conn = None
+        conn.rollback()
+        conn.close()
+
+def test_planos_usam_os_indices(cursor_teste):
+    database.init_db()
+    falhas = [r for r in migrations.verificar_planos(cursor_teste) if not r["ok"]]
+    assert not falhas, falhas
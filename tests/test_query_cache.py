@@ -0,0 +1,91 @@
+import os
+import json
+from datetime import date
+import pytest
+import data_versions
+import database
+import query_cache
+import search_index
+
+D1, D2 = date(2026, 5, 5), date(2026, 5, 6)
+
+@pytest.fixture
+def caches(monkeypatch):
+    cache, listas = query_cache.CacheConsultas(10, 60), query_cache.CacheConsultas(10, 60)
+    monkeypatch.setattr(query_cache, "cache", cache)
+    monkeypatch.setattr(query_cache, "listas", listas)
+    # Uma resposta de site (sites + data + técnico), uma de técnico em outra data e a lista de técnicos.
+    cache.guardar(("CPS", D1), "site", {("data", D1), ("tecnico", D1, "JOAO"), ("sites",)}, 0)
+    cache.guardar(("JOAO", D2), "tecnico", {("data", D2), ("tecnico", D2, "JOAO")}, 0)
+    listas.guardar(("tecnicos",), ["JOAO"], {("escala",)}, 0)
+    return cache, listas
+
+def presentes(cache, listas):
+    return {c for c in (("CPS", D1), ("JOAO", D2)) if cache.obter(c)[0] is not None} | ({("tecnicos",)} if listas.obter(("tecnicos",))[0] is not None else set())
+
+def test_invalidar_por_data(caches):
+    query_cache.invalidar(("data", D1))
+    assert presentes(*caches) == {("JOAO", D2), ("tecnicos",)}
+
+def test_invalidar_por_tecnico_so_na_data(caches):
+    query_cache.invalidar(("tecnico", D2, "JOAO"))
+    assert presentes(*caches) == {("CPS", D1), ("tecnicos",)}
+
+def test_invalidar_sites(caches):
+    query_cache.invalidar(("sites",))
+    assert presentes(*caches) == {("JOAO", D2), ("tecnicos",)}
+
+def test_invalidar_escala(caches):
+    query_cache.invalidar(("escala",))
+    assert presentes(*caches) == {("CPS", D1), ("JOAO", D2)}
+
+def test_valor_calculado_durante_invalidacao_e_descartado(caches):
+    cache, _ = caches
+    valor, geracao = cache.obter(("BSB", D1))
+    assert valor is None
+    # Um upload termina enquanto a resposta ainda está sendo montada com os dados antigos.
+    query_cache.invalidar(("data", D2))
+    cache.guardar(("BSB", D1), "velho", {("data", D1)}, geracao)
+    assert cache.obter(("BSB", D1))[0] is None
+    _, geracao = cache.obter(("BSB", D1))
+    cache.guardar(("BSB", D1), "novo", {("data", D1)}, geracao)
+    assert cache.obter(("BSB", D1))[0] == "novo"
+
+@pytest.fixture
+def aviso(monkeypatch):
+    # Aviso do NOTIFY como se viesse de outro worker (pid diferente), com versões sempre novas.
+    monkeypatch.setattr(data_versions, "_conhecidas", {})
+    versoes = iter(range(1, 100))
+    def enviar(dominio, detalhe):
+        data_versions._tratar_aviso(json.dumps({"dominio": dominio, "versao": next(versoes), "pid": os.getpid() + 1, "detalhe": detalhe}))
+    return enviar
+
+@pytest.fixture
+def indice(monkeypatch):
+    atual = search_index.IndiceBusca(sites=[], tecnicos=["JOAO"], bases=["CPS"], abas=["DDD 19"])
+    monkeypatch.setattr(search_index, "_indice", atual)
+    novo = {"indice": atual}
+    monkeypatch.setattr(database, "get_indice_busca", lambda: novo["indice"])
+    return novo
+
+def test_aviso_de_outro_worker_invalida_o_tecnico(caches, aviso):
+    aviso("escala", {"tecnico": "JOAO", "data": D2.isoformat()})
+    assert presentes(*caches) == {("CPS", D1), ("tecnicos",)}
+
+def test_aviso_de_upload_invalida_as_datas(caches, aviso, indice):
+    aviso("escala", {"datas": [D1.isoformat()]})
+    assert presentes(*caches) == {("JOAO", D2)}
+
+def test_aviso_de_upload_com_nomes_novos_limpa_tudo(caches, aviso, indice):
+    indice["indice"] = search_index.IndiceBusca(sites=[], tecnicos=["JOAO", "MARIA"], bases=["CPS"], abas=["DDD 19"])
+    aviso("escala", {"datas": [D1.isoformat()]})
+    assert presentes(*caches) == set()
+
+def test_aviso_de_sites(caches, aviso):
+    aviso("sites", None)
+    assert presentes(*caches) == {("JOAO", D2), ("tecnicos",)}
+
+def test_aviso_do_proprio_worker_e_ignorado(caches, monkeypatch):
+    monkeypatch.setattr(data_versions, "_conhecidas", {})
+    data_versions._tratar_aviso(json.dumps({"dominio": "sites", "versao": 1, "pid": os.getpid(), "detalhe": None}))
+    assert presentes(*caches) == {("CPS", D1), ("JOAO", D2), ("tecnicos",)}
@@ -0,0 +1,61 @@
+import pytest
+from rapidfuzz import fuzz
+from search_index import Colecao, LIMITE_PREFIXO
+
+# (termo, valor, score arredondado): o WRatio cru de cada par fica logo acima/abaixo de um dos cortes
+# usados no database (86 e 71 para siglas/cidades, 85 para técnicos/bases, 75 para o UPDATE da IA).
+PARES = [
+    ("JOSE SOUZA", "SAO JOSE DOS CAMPOS", 86),   # 85.5: o thefuzz arredondava e passava no corte 86
+    ("AATONIO CAOS", "ANTONIO CARLOS", 85),      # 84.62
+    ("AI SOUZA", "MARIA SOUZA", 84),             # 84.21
+    ("CPSA", "CPSB", 75),                        # 75.0
+    ("RRBEIRAOUPBTO", "RIBEIRAO PRETO", 74),     # 74.07
+    ("CAMPINAS", "CAMPOS", 71),                  # 71.43
+    ("AGARUQUAVA", "ARARAQUARA", 70),            # 70.0
+]
+
+@pytest.mark.parametrize("termo,valor,score", PARES)
+def test_corte_no_score_arredondado(termo, valor, score):
+    assert int(round(fuzz.WRatio(termo, valor))) == score
+    colecao = Colecao([valor])
+    assert colecao.melhor(termo, score) == (valor, score)
+    assert colecao.melhor(termo, score + 1) is None
+
+@pytest.mark.parametrize("corte,passa,nao_passa", [
+    (86, "JOSE SOUZA", "AATONIO CAOS"),
+    (85, "AATONIO CAOS", "AI SOUZA"),
+    (75, "CPSA", "RRBEIRAOUPBTO"),
+    (71, "CAMPINAS", "AGARUQUAVA"),
+])
+def test_cada_corte_dos_dois_lados(corte, passa, nao_passa):
+    valores = dict((t, v) for t, v, _ in PARES)
+    assert Colecao([valores[passa]]).melhor(passa, corte) is not None
+    assert Colecao([valores[nao_passa]]).melhor(nao_passa, corte) is None
+
+def test_sem_acento_e_sem_caixa():
+    colecao = Colecao(["SÃO JOSÉ DOS CAMPOS", "Ribeirão Preto"])
+    assert colecao.melhor("sao jose dos campos", 86) == ("SÃO JOSÉ DOS CAMPOS", 100)
+    assert colecao.melhor("RIBEIRAO-PRETO", 86) == ("Ribeirão Preto", 100)
+    assert colecao.melhor("José Souza", 86) == ("SÃO JOSÉ DOS CAMPOS", 86)
+
+def test_empate_fica_com_a_primeira_chave_em_ordem():
+    assert Colecao(["CPSB", "CPSA"]).melhor("CPSX", 75) == ("CPSA", 75)
+
+def test_exato_antes_do_fuzzy():
+    assert Colecao(["CPS", "CPSA"]).melhor("cps", 86) == ("CPS", 100)
+
+def test_prefixo_sem_nada_no_corte_cai_na_varredura_completa():
+    longo = "JOAO" + "X" * 40
+    colecao = Colecao([longo, "JOAU"])
+    assert colecao.prefixados("JOAO") == [longo]
+    assert colecao.melhor("JOAO", 75) == ("JOAU", 75)
+
+def test_prefixo_limitado():
+    colecao = Colecao([f"CPS{i:02d}" for i in range(LIMITE_PREFIXO + 10)])
+    assert len(colecao.prefixados("CPS")) == LIMITE_PREFIXO
+    assert colecao.melhor("CPS", 86)[0] == "CPS00"
+
+def test_nada_no_corte_ou_colecao_vazia():
+    assert Colecao(["CAMPINAS"]).melhor("BAURU", 71) is None
+    assert Colecao([]).melhor("BAURU", 71) is None
+    assert Colecao(["CAMPINAS"]).melhor("  ", 71) is None
@@ -0,0 +1,98 @@
+import json
+import time
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import weather
+
+class Stub:
+    # OpenWeather de mentira: temperatura por cidade (None = responde 500) e contagem de requisições.
+    def __init__(self):
+        self.temps, self.pedidos = {}, {}
+        stub = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                cidade = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)["q"][0].split(",")[0].upper()
+                stub.pedidos[cidade] = stub.pedidos.get(cidade, 0) + 1
+                temp = stub.temps.get(cidade)
+                if temp is None:
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+                corpo = json.dumps({"main": {"temp": temp}, "weather": [{"description": "céu limpo"}]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(corpo)
+            def log_message(self, *args): pass
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.servidor.server_address[1]}/"
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+@pytest.fixture
+def stub():
+    s = Stub()
+    yield s
+    s.servidor.shutdown()
+    s.servidor.server_close()
+
+def novo_cache(stub, **kw):
+    opcoes = dict(ttl=60, ttl_falha=60, max_stale=3600, max_itens=10, espera_miss=2)
+    opcoes.update(kw)
+    return weather.CacheClima(buscar=lambda c: weather.buscar_clima(c, url_base=stub.url, timeout=2), **opcoes)
+
+def esperar(condicao, limite=2):
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        if condicao(): return True
+        time.sleep(0.01)
+    return False
+
+def test_hit_nao_busca_de_novo(stub):
+    stub.temps["CAMPINAS"] = 25
+    cache = novo_cache(stub)
+    assert "25°C" in cache.obter("Campinas - SP")
+    assert "25°C" in cache.obter("CAMPINAS")
+    assert stub.pedidos["CAMPINAS"] == 1
+    assert cache.stats["hits"] == 1
+
+def test_vencido_e_servido_enquanto_atualiza(stub):
+    stub.temps["CAMPINAS"] = 25
+    cache = novo_cache(stub, ttl=0.05)
+    assert "25°C" in cache.obter("Campinas")
+    stub.temps["CAMPINAS"] = 30
+    time.sleep(0.1)
+    assert "25°C" in cache.obter("Campinas")
+    assert cache.stats["stale"] == 1
+    assert esperar(lambda: "30°C" in cache.obter("Campinas"))
+
+def test_falha_sem_valor_fica_em_cache_negativo(stub):
+    cache = novo_cache(stub)
+    assert cache.obter("Atlantida") == ""
+    assert cache.obter("Atlantida") == ""
+    assert stub.pedidos["ATLANTIDA"] == 1
+    assert cache.stats["falhas"] == 1
+
+def test_falha_no_refresh_mantem_o_valor_antigo(stub):
+    stub.temps["CAMPINAS"] = 25
+    cache = novo_cache(stub, ttl=0.05)
+    assert "25°C" in cache.obter("Campinas")
+    del stub.temps["CAMPINAS"]
+    time.sleep(0.1)
+    assert "25°C" in cache.obter("Campinas")
+    assert esperar(lambda: cache.stats["falhas"] == 1)
+    assert esperar(lambda: not cache._em_voo)
+    # Continua servindo o valor antigo e só tenta de novo depois de ttl_falha.
+    assert "25°C" in cache.obter("Campinas")
+    assert stub.pedidos["CAMPINAS"] == 2
+
+def test_lru_descarta_a_cidade_menos_usada(stub):
+    stub.temps.update({"A": 1, "B": 2, "C": 3})
+    cache = novo_cache(stub, max_itens=2)
+    cache.obter("A"); cache.obter("B")
+    cache.obter("A")
+    cache.obter("C")
+    assert "1°C" in cache.obter("A") and "3°C" in cache.obter("C")
+    assert "2°C" in cache.obter("B")
+    assert stub.pedidos == {"A": 1, "B": 2, "C": 1}
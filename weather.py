@@ -0,0 +1,145 @@
+import os
+import time
+import json
+import threading
+import urllib.request
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+OPENWEATHER_URL = os.getenv("OPENWEATHER_URL", "https://api.openweathermap.org/data/2.5/weather")
+OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY", "6abae122cfa3da2782b88a9b7b17ced7")
+CLIMA_TIMEOUT = float(os.getenv("CLIMA_TIMEOUT", "2"))
+CLIMA_TTL = float(os.getenv("CLIMA_TTL", "600"))
+CLIMA_TTL_FALHA = float(os.getenv("CLIMA_TTL_FALHA", "120"))
+CLIMA_MAX_STALE = float(os.getenv("CLIMA_MAX_STALE", "3600"))
+CLIMA_MAX_CIDADES = int(os.getenv("CLIMA_MAX_CIDADES", "500"))
+# Quanto tempo uma consulta espera pelo primeiro fetch de uma cidade nunca vista (0 = não espera).
+# Com 0 a primeira resposta sai sem clima e fora do cache de respostas, e o aquecer() do modo paralelo
+# só ajuda as consultas seguintes; 0.4 s cobre uma chamada típica ao OpenWeather, já iniciada pelo aquecer().
+CLIMA_ESPERA_MISS = float(os.getenv("CLIMA_ESPERA_MISS", "0.4"))
+# Prazo único para as cidades de um /chat_batch que ainda não estão no cache.
+CLIMA_ESPERA_LOTE = float(os.getenv("CLIMA_ESPERA_LOTE", "2"))
+
+def limpar_cidade(cidade):
+    return cidade.split('-')[0].split('/')[0].strip()
+
+def buscar_clima(cidade, url_base=None, timeout=None):
+    cidade_encoded = urllib.parse.quote(f"{limpar_cidade(cidade)},BR")
+    url = f"{url_base or OPENWEATHER_URL}?q={cidade_encoded}&appid={OPENWEATHER_API_KEY}&units=metric&lang=pt_br"
+    req = urllib.request.Request(url)
+    with urllib.request.urlopen(req, timeout=timeout or CLIMA_TIMEOUT) as response:
+        dados = json.loads(response.read().decode())
+        temp = round(dados['main']['temp'])
+        desc = dados['weather'][0]['description'].capitalize()
+        return f"<br>☁️ <b>Clima Agora:</b> {temp}°C - {desc}"
+
+class CacheClima:
+    # LRU por cidade. Entradas vencidas continuam sendo servidas (até max_stale) enquanto
+    # um refresh roda em segundo plano; falhas ficam em cache negativo por ttl_falha.
+    def __init__(self, buscar=buscar_clima, ttl=CLIMA_TTL, ttl_falha=CLIMA_TTL_FALHA, max_stale=CLIMA_MAX_STALE, max_itens=CLIMA_MAX_CIDADES, espera_miss=CLIMA_ESPERA_MISS, workers=4):
+        self.buscar = buscar
+        self.ttl, self.ttl_falha, self.max_stale = ttl, ttl_falha, max_stale
+        self.max_itens = max_itens
+        self.espera_miss = espera_miss
+        self._itens = OrderedDict()
+        self._em_voo = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="clima")
+        self.stats = {"hits": 0, "stale": 0, "misses": 0, "falhas": 0}
+
+    def _guardar(self, chave, valor, ttl):
+        agora = time.monotonic()
+        with self._lock:
+            self._itens[chave] = (valor, agora + ttl, agora)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens: self._itens.popitem(last=False)
+
+    def _atualizar(self, cidade, chave):
+        try:
+            self._guardar(chave, self.buscar(cidade), self.ttl)
+        except Exception:
+            self.stats["falhas"] += 1
+            # Valor antigo ainda servível: continua valendo (idade contada do último fetch bom) e só
+            # a próxima tentativa fica para daqui a ttl_falha. Cache negativo só para cidade sem valor.
+            agora = time.monotonic()
+            with self._lock:
+                item = self._itens.get(chave)
+                if item and item[0] and agora - item[2] < self.max_stale:
+                    self._itens[chave] = (item[0], agora + self.ttl_falha, item[2])
+                    return
+            self._guardar(chave, "", self.ttl_falha)
+        finally:
+            with self._lock: evento = self._em_voo.pop(chave, None)
+            if evento: evento.set()
+
+    def _agendar(self, cidade, chave):
+        with self._lock:
+            evento = self._em_voo.get(chave)
+            if evento: return evento
+            evento = self._em_voo[chave] = threading.Event()
+        self._executor.submit(self._atualizar, cidade, chave)
+        return evento
+
+    def _ler(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item: self._itens.move_to_end(chave)
+            return item
+
+    def _consultar(self, cidade):
+        # (valor servível agora, evento do fetch em voo se a cidade não está no cache, chave)
+        chave = limpar_cidade(cidade).upper()
+        if not chave: return "", None, chave
+        item = self._ler(chave)
+        agora = time.monotonic()
+        if item and agora - item[2] < self.max_stale:
+            if agora >= item[1]:
+                self.stats["stale"] += 1
+                self._agendar(cidade, chave)
+            else: self.stats["hits"] += 1
+            return item[0], None, chave
+        self.stats["misses"] += 1
+        return "", self._agendar(cidade, chave), chave
+
+    def obter_estado(self, cidade):
+        # (texto, pendente). pendente: cidade sem valor e fetch ainda em voo após espera_miss.
+        # "" com pendente False é resultado confirmado (cache negativo, falha, cidade vazia).
+        if not cidade: return "", False
+        valor, evento, chave = self._consultar(cidade)
+        if evento is None: return valor, False
+        if self.espera_miss > 0 and evento.wait(self.espera_miss):
+            item = self._ler(chave)
+            return (item[0] if item else ""), False
+        return "", True
+
+    def obter(self, cidade):
+        return self.obter_estado(cidade)[0]
+
+    def aquecer(self, cidade):
+        # Dispara o fetch de uma cidade ausente ou vencida sem esperar nem contar nas estatísticas;
+        # o obter() seguinte pega o mesmo fetch em voo (usado pelo modo paralelo do query_data).
+        chave = limpar_cidade(cidade or "").upper()
+        if not chave: return
+        item = self._ler(chave)
+        if item is None or time.monotonic() >= item[1]: self._agendar(cidade, chave)
+
+    def obter_varios(self, cidades, espera=None):
+        # Usado pelo /chat_batch: dispara de uma vez os fetches das cidades fora do cache (rodam em
+        # paralelo no pool) e espera por todos com um único prazo, em vez de um prazo por cidade.
+        espera = self.espera_miss if espera is None else espera
+        resultado, pendentes = {}, {}
+        for cidade in dict.fromkeys(c for c in cidades if c):
+            resultado[cidade], evento, chave = self._consultar(cidade)
+            if evento: pendentes[cidade] = (evento, chave)
+        limite = time.monotonic() + espera
+        for cidade, (evento, chave) in pendentes.items():
+            if espera > 0 and evento.wait(max(0, limite - time.monotonic())):
+                item = self._ler(chave)
+                resultado[cidade] = item[0] if item else ""
+        return resultado
+
+    def limpar(self):
+        with self._lock: self._itens.clear()
+
+cache_clima = CacheClima()